@@ -1,24 +1,50 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
 import io
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
-from PIL import Image
 import time
+import random
+import re
 import json
-import pandas as pd
 import zipfile
-import matplotlib.pyplot as plt
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from datetime import datetime
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
 import hashlib
+import hmac
+import secrets
 import sqlite3
+import threading
+import collections
+import itertools
+import queue
+import atexit
+import contextlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    import orjson
+    json_loads = orjson.loads
+    
+    def json_dumps(data):
+        return orjson.dumps(data).decode()
+    
+    def json_dumps_pretty(data):
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+    
+    def json_dumps_pretty(data):
+        return json.dumps(data, indent=2)
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -35,101 +61,247 @@ st.set_page_config(
 # DATABASE FUNCTIONS
 # ============================================================================
 
-def init_database():
-    """Initialize database with migration support"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'ppt_generator.db'
+USAGE_LOG_FLUSH_INTERVAL = 0.5
+USAGE_LOG_BATCH_SIZE = 50
+USAGE_LOG_MAX_ATTEMPTS = 3
+READ_POOL_SIZE = 4
+SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1}
+# Checked against when the username is unknown, so both paths cost one scrypt
+DUMMY_PASSWORD_HASH = f"scrypt${'00' * 16}${'00' * 64}"
+
+def configure_connection(conn):
+    """Apply per-connection PRAGMAs"""
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+@st.cache_resource
+def get_db_writer():
+    """Write queue and usage log buffer, served by a single writer thread"""
+    jobs = queue.Queue()
+    buffer = collections.deque()
+    
+    def writer_loop():
+        # The only read-write connection; it never leaves this thread
+        conn = configure_connection(sqlite3.connect(DB_PATH, cached_statements=256))
+        last_flush = time.monotonic()
+        failed_flushes = 0
+        while True:
+            # The thread must outlive any error, or every later run_write would wait forever
+            try:
+                try:
+                    job = jobs.get(timeout=USAGE_LOG_FLUSH_INTERVAL)
+                except queue.Empty:
+                    job = None
+                
+                # None is a wake-up from log_usage once a full batch is waiting
+                if job is not None:
+                    write, future = job
+                    if future.set_running_or_notify_cancel():
+                        try:
+                            future.set_result(write(conn))
+                        except Exception as e:
+                            future.set_exception(e)
+                
+                if len(buffer) >= USAGE_LOG_BATCH_SIZE or time.monotonic() - last_flush >= USAGE_LOG_FLUSH_INTERVAL:
+                    last_flush = time.monotonic()
+                    requeue = failed_flushes + 1 < USAGE_LOG_MAX_ATTEMPTS
+                    failed_flushes = 0 if flush_usage_logs(buffer, conn, requeue) else failed_flushes + 1
+            except Exception:
+                logger.exception("Database writer error")
+    
+    threading.Thread(target=writer_loop, daemon=True).start()
+    atexit.register(lambda: flush_usage_logs(buffer, configure_connection(sqlite3.connect(DB_PATH)), requeue=False))
+    return jobs, buffer
+
+def run_write(write):
+    """Run write(conn) on the writer thread and return its result"""
+    future = Future()
+    get_db_writer()[0].put((write, future))
+    return future.result()
+
+@st.cache_resource
+def get_read_pool():
+    """Read-only connections shared by all script and worker threads"""
+    pool = queue.Queue()
+    for _ in range(READ_POOL_SIZE):
+        pool.put(configure_connection(sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True,
+                                                      check_same_thread=False, cached_statements=256)))
+    return pool
+
+@contextlib.contextmanager
+def read_conn():
+    """Borrow a read-only connection for the block; WAL lets it read while the writer commits"""
+    pool = get_read_pool()
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+def create_schema(conn):
+    """Create tables and indexes, migrate old columns and seed the admin user"""
     c = conn.cursor()
     
-    # Create users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE NOT NULL,
-                  password_hash TEXT NOT NULL,
-                  email TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  last_login TIMESTAMP,
-                  is_active BOOLEAN DEFAULT 1,
-                  role TEXT DEFAULT 'user')''')
-    
-    # Create usage_logs table
-    c.execute('''CREATE TABLE IF NOT EXISTS usage_logs
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  action TEXT,
-                  topic TEXT,
-                  slides_count INTEGER,
-                  timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
-    
-    # Create sessions table
-    c.execute('''CREATE TABLE IF NOT EXISTS sessions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  logout_time TIMESTAMP,
-                  is_active BOOLEAN DEFAULT 1,
-                  session_token TEXT,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
-    
-    # Migration: Add missing columns
+    # WAL is persistent per database file
+    c.execute("PRAGMA journal_mode=WAL")
+    
+    # Schema, migrations, indexes and the admin seed commit together with one sync
+    c.execute("BEGIN")
     try:
-        c.execute("PRAGMA table_info(sessions)")
-        columns = [column[1] for column in c.fetchall()]
-        
-        if 'is_active' not in columns:
-            c.execute("ALTER TABLE sessions ADD COLUMN is_active BOOLEAN DEFAULT 1")
-            conn.commit()
+        # Create users table
+        c.execute('''CREATE TABLE IF NOT EXISTS users
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      username TEXT UNIQUE NOT NULL,
+                      password_hash TEXT NOT NULL,
+                      email TEXT,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      last_login TIMESTAMP,
+                      is_active BOOLEAN DEFAULT 1,
+                      role TEXT DEFAULT 'user')''')
+        
+        # Create usage_logs table
+        c.execute('''CREATE TABLE IF NOT EXISTS usage_logs
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id INTEGER,
+                      action TEXT,
+                      topic TEXT,
+                      slides_count INTEGER,
+                      timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      FOREIGN KEY (user_id) REFERENCES users (id))''')
+        
+        # Create sessions table
+        c.execute('''CREATE TABLE IF NOT EXISTS sessions
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id INTEGER,
+                      login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      logout_time TIMESTAMP,
+                      is_active BOOLEAN DEFAULT 1,
+                      session_token TEXT,
+                      FOREIGN KEY (user_id) REFERENCES users (id))''')
+        
+        # Create templates table
+        c.execute('''CREATE TABLE IF NOT EXISTS templates
+                     (id TEXT PRIMARY KEY,
+                      user_id INTEGER,
+                      name TEXT,
+                      created_at TEXT,
+                      usage_count INTEGER DEFAULT 0,
+                      data TEXT,
+                      FOREIGN KEY (user_id) REFERENCES users (id))''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS slides_cache
+                     (key TEXT PRIMARY KEY,
+                      json TEXT,
+                      ts INTEGER)''')
+        
+        # Migration: Add missing columns
+        try:
+            c.execute("PRAGMA table_info(sessions)")
+            columns = [column[1] for column in c.fetchall()]
             
-        if 'session_token' not in columns:
-            c.execute("ALTER TABLE sessions ADD COLUMN session_token TEXT")
-            conn.commit()
-    except Exception as e:
-        pass
-    
-    # Create admin user if not exists
-    c.execute("SELECT * FROM users WHERE username = 'admin'")
-    if not c.fetchone():
-        admin_password = hashlib.sha256('admin123'.encode()).hexdigest()
-        c.execute("INSERT INTO users (username, password_hash, email, role) VALUES (?, ?, ?, ?)",
-                  ('admin', admin_password, 'admin@pptgen.com', 'admin'))
+            if 'is_active' not in columns:
+                c.execute("ALTER TABLE sessions ADD COLUMN is_active BOOLEAN DEFAULT 1")
+                
+            if 'session_token' not in columns:
+                c.execute("ALTER TABLE sessions ADD COLUMN session_token TEXT")
+        except Exception as e:
+            pass
+        
+        # Indexes for the stats, history and online-user queries; the usage_logs
+        # ones include slides_count so the stats sums never read the table itself
+        c.execute("DROP INDEX IF EXISTS idx_usage_user_action")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_usage_user_action_slides ON usage_logs(user_id, action, slides_count)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_usage_action_slides ON usage_logs(action, slides_count)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage_logs(timestamp DESC)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_usage_user_timestamp ON usage_logs(user_id, timestamp DESC)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_active ON sessions(user_id, is_active)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_login_time ON sessions(login_time)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_active_login ON sessions(login_time DESC) WHERE is_active = 1")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_templates_user ON templates(user_id, created_at DESC)")
+        c.execute("PRAGMA optimize")
+        
+        # Create admin user if not exists
+        c.execute("SELECT * FROM users WHERE username = 'admin'")
+        if not c.fetchone():
+            c.execute("INSERT INTO users (username, password_hash, email, role) VALUES (?, ?, ?, ?)",
+                      ('admin', hash_password('admin123'), 'admin@pptgen.com', 'admin'))
+    except Exception:
+        # The writer connection is shared, so the next write must not commit a half-built schema
+        conn.rollback()
+        raise
     
     conn.commit()
-    conn.close()
+
+@st.cache_resource
+def init_database():
+    """Initialize database with migration support, once per server process"""
+    # Runs on the writer's connection, the only read-write one the app opens
+    run_write(create_schema)
 
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Salted scrypt hash, stored as scrypt$<salt>$<hash>"""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, **SCRYPT_PARAMS)
+    return f"scrypt${salt.hex()}${digest.hex()}"
+
+def check_password(stored_hash, password):
+    """Check a password against a scrypt hash or a legacy unsalted SHA-256 hash"""
+    if stored_hash.startswith("scrypt$"):
+        _, salt, digest = stored_hash.split("$")
+        candidate = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), **SCRYPT_PARAMS)
+        return hmac.compare_digest(candidate.hex(), digest)
+    return hmac.compare_digest(stored_hash, hashlib.sha256(password.encode()).hexdigest())
 
 def verify_user(username, password):
     """Verify and login user"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    
     try:
-        password_hash = hash_password(password)
-        c.execute("SELECT id, username, role, is_active FROM users WHERE username = ? AND password_hash = ?",
-                  (username, password_hash))
-        
-        user = c.fetchone()
-        
-        if user and user[3]:
-            c.execute("UPDATE users SET last_login = ? WHERE id = ?", (datetime.now(), user[0]))
-            session_token = hashlib.md5(f"{user[0]}{datetime.now()}".encode()).hexdigest()
+        # Disabled accounts match no row and are checked against the dummy hash,
+        # so they take as long to reject as a wrong password
+        with read_conn() as conn:
+            user = conn.execute("SELECT id, username, role, is_active, password_hash FROM users WHERE username = ? AND is_active = 1",
+                                (username,)).fetchone()
+        password_ok = check_password(user[4] if user else DUMMY_PASSWORD_HASH, password)
+        
+        if user and password_ok:
+            session_token = secrets.token_hex(16)
             
-            try:
-                c.execute("UPDATE sessions SET is_active = 0, logout_time = ? WHERE user_id = ? AND is_active = 1", 
-                          (datetime.now(), user[0]))
-            except sqlite3.OperationalError:
-                pass
+            # Rehash legacy SHA-256 passwords on their next successful login
+            new_hash = None if user[4].startswith("scrypt$") else hash_password(password)
             
-            try:
-                c.execute("INSERT INTO sessions (user_id, login_time, is_active, session_token) VALUES (?, ?, ?, ?)",
-                          (user[0], datetime.now(), 1, session_token))
-            except sqlite3.OperationalError:
-                c.execute("INSERT INTO sessions (user_id, login_time) VALUES (?, ?)",
-                          (user[0], datetime.now()))
+            # One timestamp for last_login and for closing and opening the sessions
+            now = datetime.now()
             
-            conn.commit()
-            conn.close()
+            def record_login(conn):
+                with conn:
+                    conn.execute("UPDATE users SET last_login = ? WHERE id = ?", (now, user[0]))
+                    if new_hash:
+                        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hash, user[0]))
+                    
+                    try:
+                        conn.execute("UPDATE sessions SET is_active = 0, logout_time = ? WHERE user_id = ? AND is_active = 1", 
+                                     (now, user[0]))
+                    except sqlite3.OperationalError:
+                        pass
+                    
+                    try:
+                        conn.execute("INSERT INTO sessions (user_id, login_time, is_active, session_token) VALUES (?, ?, ?, ?)",
+                                     (user[0], now, 1, session_token))
+                    except sqlite3.OperationalError:
+                        conn.execute("INSERT INTO sessions (user_id, login_time) VALUES (?, ?)",
+                                     (user[0], now))
+            
+            run_write(record_login)
+            get_currently_logged_in_users.clear()
+            get_system_stats.clear()
+            get_user_stats.clear()
+            get_stats_for_users.clear()
             
             return {
                 'id': user[0], 
@@ -139,273 +311,440 @@ def verify_user(username, password):
                 'session_token': session_token
             }
         
-        conn.close()
         return None
     except Exception as e:
-        conn.close()
         return None
 
 def create_user_by_admin(username, password, email):
     """Admin creates user"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
+    password_hash = hash_password(password)
+    
+    def insert_user(conn):
+        with conn:
+            conn.execute("INSERT INTO users (username, password_hash, email, role) VALUES (?, ?, ?, ?)",
+                         (username, password_hash, email, 'user'))
+    
     try:
-        password_hash = hash_password(password)
-        c.execute("INSERT INTO users (username, password_hash, email, role) VALUES (?, ?, ?, ?)",
-                  (username, password_hash, email, 'user'))
-        conn.commit()
-        conn.close()
+        run_write(insert_user)
+        get_all_users.clear()
+        get_system_stats.clear()
         return True
     except sqlite3.IntegrityError:
-        conn.close()
         return False
 
-def logout_user(user_id):
-    """Logout user"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
+def logout_and_log(user_id):
+    """Logout user and log the logout in a single transaction"""
+    def end_sessions_and_log(conn):
+        with conn:
+            conn.execute("UPDATE sessions SET is_active = 0, logout_time = ? WHERE user_id = ? AND is_active = 1",
+                         (datetime.now(), user_id))
+            conn.execute("INSERT INTO usage_logs (user_id, action, topic, slides_count) VALUES (?, ?, ?, ?)",
+                         (user_id, 'logout', "", 0))
+    
+    run_write(end_sessions_and_log)
+    get_currently_logged_in_users.clear()
+    get_system_stats.clear()
+    get_all_user_activities.clear()
+    get_user_activity_details.clear()
+
+def flush_usage_logs(buffer, conn, requeue=True):
+    """Write all buffered usage logs in a single transaction; False if they went back to the buffer"""
+    insert = "INSERT INTO usage_logs (user_id, action, topic, slides_count, timestamp) VALUES (?, ?, ?, ?, ?)"
+    batch = []
+    while buffer:
+        batch.append(buffer.popleft())
+    if not batch:
+        return True
     try:
-        c.execute("UPDATE sessions SET is_active = 0, logout_time = ? WHERE user_id = ? AND is_active = 1",
-                  (datetime.now(), user_id))
-    except sqlite3.OperationalError:
-        c.execute("UPDATE sessions SET logout_time = ? WHERE user_id = ? AND logout_time IS NULL",
-                  (datetime.now(), user_id))
-    conn.commit()
-    conn.close()
+        with conn:
+            conn.executemany(insert, batch)
+    except sqlite3.Error:
+        if requeue:
+            buffer.extendleft(reversed(batch))
+            return False
+        # Out of attempts: keep the rows that insert on their own and drop the rest
+        dropped = 0
+        for row in batch:
+            try:
+                with conn:
+                    conn.execute(insert, row)
+            except sqlite3.Error:
+                dropped += 1
+        if dropped:
+            logger.warning("Dropped %d usage log entries that could not be written", dropped)
+    get_all_user_activities.clear()
+    get_system_stats.clear()
+    get_user_stats.clear()
+    get_stats_for_users.clear()
+    get_user_activity_details.clear()
+    return True
 
 def log_usage(user_id, action, topic="", slides_count=0):
-    """Log activity"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("INSERT INTO usage_logs (user_id, action, topic, slides_count) VALUES (?, ?, ?, ?)",
-              (user_id, action, topic, slides_count))
-    conn.commit()
-    conn.close()
+    """Log activity; the writer thread flushes the buffer in batches"""
+    jobs, buffer = get_db_writer()
+    # Stamp now, in CURRENT_TIMESTAMP's format, so the batching delay does not skew the log
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    buffer.append((user_id, action, topic, slides_count, timestamp))
+    if len(buffer) >= USAGE_LOG_BATCH_SIZE:
+        jobs.put(None)
 
+@st.cache_data(ttl=10, show_spinner=False)
 def get_user_stats(user_id):
     """Get user stats"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM usage_logs WHERE user_id = ? AND action = 'generate_presentation'", (user_id,))
-    total_presentations = c.fetchone()[0]
-    c.execute("SELECT SUM(slides_count) FROM usage_logs WHERE user_id = ? AND action = 'generate_presentation'", (user_id,))
-    total_slides = c.fetchone()[0] or 0
-    c.execute("SELECT COUNT(*) FROM sessions WHERE user_id = ?", (user_id,))
-    total_logins = c.fetchone()[0]
-    conn.close()
-    return {'total_presentations': total_presentations, 'total_slides': total_slides, 'total_logins': total_logins}
+    with read_conn() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT COUNT(*), COALESCE(SUM(slides_count), 0),
+                (SELECT COUNT(*) FROM sessions WHERE user_id = ?)
+            FROM usage_logs
+            WHERE user_id = ? AND action = 'generate_presentation'
+        """, (user_id, user_id))
+        total_presentations, total_slides, total_logins = c.fetchone()
+        return {'total_presentations': total_presentations, 'total_slides': total_slides, 'total_logins': total_logins}
+
+@st.cache_data(ttl=10, show_spinner=False)
+def get_stats_for_users(user_ids):
+    """Get stats for several users in one query, keyed by user id"""
+    if not user_ids:
+        return {}
+    placeholders = ",".join("?" * len(user_ids))
+    with read_conn() as conn:
+        c = conn.cursor()
+        # Presentation count and slide total share one pass over each user's logs
+        c.execute(f"""
+            SELECT u.id,
+                COALESCE(p.total_presentations, 0),
+                COALESCE(p.total_slides, 0),
+                (SELECT COUNT(*) FROM sessions WHERE user_id = u.id)
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS total_presentations, SUM(slides_count) AS total_slides
+                FROM usage_logs
+                WHERE action = 'generate_presentation' AND user_id IN ({placeholders})
+                GROUP BY user_id
+            ) p ON p.user_id = u.id
+            WHERE u.id IN ({placeholders})
+        """, list(user_ids) * 2)
+        return {
+            user_id: {'total_presentations': total_presentations, 'total_slides': total_slides, 'total_logins': total_logins}
+            for user_id, total_presentations, total_slides, total_logins in c.fetchall()
+        }
 
+@st.cache_data(ttl=30, show_spinner=False)
 def get_all_users():
-    """Get all users"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("SELECT id, username, email, created_at, last_login, is_active, role FROM users ORDER BY created_at DESC")
-    users = c.fetchall()
-    conn.close()
-    return users
+    """Get all users as a display-ready DataFrame"""
+    import pandas as pd
+    with read_conn() as conn:
+        return pd.read_sql_query("""
+            SELECT id AS ID,
+                   username AS Username,
+                   COALESCE(NULLIF(email, ''), 'N/A') AS Email,
+                   created_at AS Created,
+                   CASE WHEN is_active THEN '✅' ELSE '❌' END AS Active,
+                   role AS Role
+            FROM users
+            ORDER BY created_at DESC
+        """, conn)
 
+@st.cache_data(ttl=10, show_spinner=False)
 def get_currently_logged_in_users():
     """Get currently logged in users"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    try:
-        c.execute("""
-            SELECT u.id, u.username, u.email, s.login_time, u.role
-            FROM sessions s
-            JOIN users u ON s.user_id = u.id
-            WHERE s.is_active = 1
-            ORDER BY s.login_time DESC
-        """)
-        active_users = c.fetchall()
-    except sqlite3.OperationalError:
-        active_users = []
-    conn.close()
-    return active_users
+    with read_conn() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("""
+                SELECT u.id, u.username, u.email, s.login_time, u.role
+                FROM sessions s
+                JOIN users u ON s.user_id = u.id
+                WHERE s.is_active = 1
+                ORDER BY s.login_time DESC
+            """)
+            active_users = c.fetchall()
+        except sqlite3.OperationalError:
+            active_users = []
+        return active_users
 
+@st.cache_data(ttl=10, show_spinner=False)
 def get_user_activity_details(user_id):
     """Get detailed activity for a specific user"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("""
-        SELECT action, topic, slides_count, timestamp
-        FROM usage_logs
-        WHERE user_id = ?
-        ORDER BY timestamp DESC
-        LIMIT 20
-    """, (user_id,))
-    activities = c.fetchall()
-    conn.close()
-    return activities
-
-def get_all_user_activities():
-    """Get all activities from all users"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("""
-        SELECT u.username, l.action, l.topic, l.slides_count, l.timestamp
-        FROM usage_logs l
-        JOIN users u ON l.user_id = u.id
-        ORDER BY l.timestamp DESC
-        LIMIT 100
-    """)
-    activities = c.fetchall()
-    conn.close()
-    return activities
+    with read_conn() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT action, topic, slides_count, timestamp
+            FROM usage_logs
+            WHERE user_id = ?
+            ORDER BY timestamp DESC
+            LIMIT 20
+        """, (user_id,))
+        return c.fetchall()
+
+@st.cache_data(ttl=10, show_spinner=False)
+def get_all_user_activities(limit=100, offset=0):
+    """Get a page of activities from all users as a display-ready DataFrame"""
+    import pandas as pd
+    with read_conn() as conn:
+        return pd.read_sql_query("""
+            SELECT u.username AS Username,
+                   l.action AS Action,
+                   COALESCE(NULLIF(l.topic, ''), '-') AS Topic,
+                   CASE WHEN l.slides_count THEN l.slides_count ELSE '-' END AS Slides,
+                   l.timestamp AS Timestamp
+            FROM usage_logs l
+            JOIN users u ON l.user_id = u.id
+            ORDER BY l.timestamp DESC
+            LIMIT ? OFFSET ?
+        """, conn, params=(limit, offset))
 
+@st.cache_data(ttl=10, show_spinner=False)
 def get_system_stats():
     """Get system stats"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM users WHERE role = 'user'")
-    total_users = c.fetchone()[0]
-    try:
-        c.execute("SELECT COUNT(*) FROM sessions WHERE is_active = 1")
-        currently_online = c.fetchone()[0]
-    except sqlite3.OperationalError:
-        currently_online = 0
-    c.execute("SELECT COUNT(*) FROM usage_logs WHERE action = 'generate_presentation'")
-    total_presentations = c.fetchone()[0]
-    c.execute("SELECT SUM(slides_count) FROM usage_logs WHERE action = 'generate_presentation'")
-    total_slides = c.fetchone()[0] or 0
-    c.execute("SELECT COUNT(*) FROM sessions WHERE DATE(login_time) = DATE('now')")
-    today_logins = c.fetchone()[0]
-    conn.close()
-    return {
-        'total_users': total_users,
-        'currently_online': currently_online,
-        'total_presentations': total_presentations,
-        'total_slides': total_slides,
-        'today_logins': today_logins
-    }
+    # login_time holds local datetime.now() values, so "today" is the local calendar day
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    tomorrow = today + timedelta(days=1)
+    
+    with read_conn() as conn:
+        c = conn.cursor()
+        # Presentation count and slide total share one pass over usage_logs
+        c.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users WHERE role = 'user'),
+                (SELECT COUNT(*) FROM sessions WHERE is_active = 1),
+                p.total_presentations,
+                p.total_slides,
+                (SELECT COUNT(*) FROM sessions WHERE login_time >= ? AND login_time < ?)
+            FROM (
+                SELECT COUNT(*) AS total_presentations, COALESCE(SUM(slides_count), 0) AS total_slides
+                FROM usage_logs
+                WHERE action = 'generate_presentation'
+            ) p
+        """, (today.isoformat(" "), tomorrow.isoformat(" ")))
+        total_users, currently_online, total_presentations, total_slides, today_logins = c.fetchone()
+        return {
+            'total_users': total_users,
+            'currently_online': currently_online,
+            'total_presentations': total_presentations,
+            'total_slides': total_slides,
+            'today_logins': today_logins
+        }
 
 def toggle_user_status(user_id, is_active):
     """Enable/disable user"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("UPDATE users SET is_active = ? WHERE id = ?", (is_active, user_id))
-    conn.commit()
-    conn.close()
+    def update_status(conn):
+        with conn:
+            conn.execute("UPDATE users SET is_active = ? WHERE id = ?", (is_active, user_id))
+    
+    run_write(update_status)
+    get_all_users.clear()
 
 def delete_user(user_id):
     """Delete user"""
-    conn = sqlite3.connect('ppt_generator.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    def delete_row(conn):
+        with conn:
+            conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    
+    run_write(delete_row)
+    get_all_users.clear()
+    get_all_user_activities.clear()
+    get_currently_logged_in_users.clear()
+    get_system_stats.clear()
+    get_user_stats.clear()
+    get_stats_for_users.clear()
+    get_user_activity_details.clear()
 
 # ============================================================================
 # TEMPLATE MANAGEMENT FUNCTIONS
 # ============================================================================
 
+TEMPLATE_ID_ATTEMPTS = 5
+
+@st.cache_resource
+def get_template_counter():
+    """Template ID counter, seeded past the largest generated ID in the templates table"""
+    with read_conn() as conn:
+        c = conn.cursor()
+        # Generated IDs are t plus 8 hex digits, so the largest one sorts last
+        c.execute("SELECT MAX(id) FROM templates WHERE id GLOB 't" + "[0-9a-f]" * 8 + "'")
+        last_id = c.fetchone()[0]
+        return itertools.count(int(last_id[1:], 16) + 1 if last_id else 1)
+
 def generate_template_id():
     """Generate unique template ID"""
-    return hashlib.md5(str(datetime.now().timestamp()).encode()).hexdigest()[:8]
+    return f"t{next(get_template_counter()):08x}"
 
-def save_template_to_state(name, template_data):
-    """Save template to session state"""
-    template_id = generate_template_id()
-    template_data['id'] = template_id
+def save_template(user_id, name, template_data):
+    """Save template to the database"""
     template_data['name'] = name
     template_data['created_at'] = datetime.now().strftime("%Y-%m-%d %H:%M")
     template_data['usage_count'] = 0
-    st.session_state.templates[template_id] = template_data
-    return template_id
+    
+    def insert_template(conn):
+        with conn:
+            conn.execute("INSERT INTO templates (id, user_id, name, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                         (template_data['id'], user_id, name, template_data['created_at'], json_dumps(template_data)))
+    
+    # Imported templates keep their own IDs, so skip the few the counter may run into
+    for attempt in range(TEMPLATE_ID_ATTEMPTS):
+        template_data['id'] = generate_template_id()
+        try:
+            run_write(insert_template)
+            break
+        except sqlite3.IntegrityError:
+            if attempt == TEMPLATE_ID_ATTEMPTS - 1:
+                raise
+    
+    get_user_templates.clear()
+    return template_data['id']
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_user_templates(user_id):
+    """Get template metadata for a user, without the template bodies"""
+    with read_conn() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, name, json_extract(data, '$.category'), json_extract(data, '$.slide_count')
+            FROM templates
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+        """, (user_id,))
+        return c.fetchall()
 
-def load_template_from_state(template_id):
-    """Load template from session state"""
-    return st.session_state.templates.get(template_id, None)
+def load_template(template_id):
+    """Load a template from the database"""
+    with read_conn() as conn:
+        c = conn.cursor()
+        c.execute("SELECT data FROM templates WHERE id = ?", (template_id,))
+        row = c.fetchone()
+        return json_loads(row[0]) if row else None
 
 def delete_template(template_id):
-    """Delete template from session state"""
-    if template_id in st.session_state.templates:
-        del st.session_state.templates[template_id]
-        return True
-    return False
+    """Delete template from the database"""
+    def delete_row(conn):
+        with conn:
+            return conn.execute("DELETE FROM templates WHERE id = ?", (template_id,)).rowcount
+    
+    deleted = run_write(delete_row)
+    get_user_templates.clear()
+    return deleted > 0
 
-def export_all_templates():
-    """Export all templates as JSON"""
-    return json.dumps(st.session_state.templates, indent=2)
+def export_all_templates(user_id):
+    """Export all of a user's templates as JSON"""
+    with read_conn() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, data FROM templates WHERE user_id = ?", (user_id,))
+        return json_dumps_pretty({template_id: json_loads(data) for template_id, data in c.fetchall()})
 
-def import_templates(json_data):
+def import_templates(user_id, json_data):
     """Import templates from JSON"""
     try:
-        templates = json.loads(json_data)
-        st.session_state.templates.update(templates)
+        templates = json_loads(json_data)
+        rows = [
+            (template_id, user_id, template.get('name', template_id), template.get('created_at', ''), json_dumps(template))
+            for template_id, template in templates.items()
+        ]
+        
+        def upsert_templates(conn):
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO templates (id, user_id, name, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                                 rows)
+        
+        run_write(upsert_templates)
+        get_user_templates.clear()
         return True
     except:
         return False
 
+PRESET_TEMPLATES = {
+    "pitch_deck": {
+        "name": "🚀 Startup Pitch Deck",
+        "category": "Pitch",
+        "slide_count": 10,
+        "tone": "Persuasive",
+        "audience": "Investors",
+        "theme": "Gradient Modern",
+        "image_mode": "With Images",
+        "language": "English",
+        "description": "Perfect for startup pitches with 10-slide structure"
+    },
+    "corporate_report": {
+        "name": "📈 Corporate Report",
+        "category": "Business",
+        "slide_count": 12,
+        "tone": "Formal",
+        "audience": "Corporate",
+        "theme": "Corporate Blue",
+        "image_mode": "With Images",
+        "language": "English",
+        "description": "Professional business reporting format"
+    },
+    "training_session": {
+        "name": "🎓 Training Session",
+        "category": "Training",
+        "slide_count": 15,
+        "tone": "Educational",
+        "audience": "Students",
+        "theme": "Pastel Soft",
+        "image_mode": "With Images",
+        "language": "English",
+        "description": "Educational content with clear structure"
+    },
+    "sales_pitch": {
+        "name": "💼 Sales Pitch",
+        "category": "Sales",
+        "slide_count": 8,
+        "tone": "Persuasive",
+        "audience": "Clients",
+        "theme": "Professional Green",
+        "image_mode": "With Images",
+        "language": "English",
+        "description": "Compelling sales presentation format"
+    },
+    "tech_overview": {
+        "name": "🔧 Technical Overview",
+        "category": "Technical",
+        "slide_count": 10,
+        "tone": "Neutral",
+        "audience": "Managers",
+        "theme": "Minimal Dark",
+        "image_mode": "With Images",
+        "language": "English",
+        "description": "Technical documentation and overview"
+    },
+    "marketing_campaign": {
+        "name": "📣 Marketing Campaign",
+        "category": "Marketing",
+        "slide_count": 9,
+        "tone": "Inspirational",
+        "audience": "Corporate",
+        "theme": "Elegant Purple",
+        "image_mode": "With Images",
+        "language": "English",
+        "description": "Creative marketing strategy presentation"
+    }
+}
+
 def get_preset_templates():
     """Get preset professional templates"""
-    return {
-        "pitch_deck": {
-            "name": "🚀 Startup Pitch Deck",
-            "category": "Pitch",
-            "slide_count": 10,
-            "tone": "Persuasive",
-            "audience": "Investors",
-            "theme": "Gradient Modern",
-            "image_mode": "With Images",
-            "language": "English",
-            "description": "Perfect for startup pitches with 10-slide structure"
-        },
-        "corporate_report": {
-            "name": "📈 Corporate Report",
-            "category": "Business",
-            "slide_count": 12,
-            "tone": "Formal",
-            "audience": "Corporate",
-            "theme": "Corporate Blue",
-            "image_mode": "With Images",
-            "language": "English",
-            "description": "Professional business reporting format"
-        },
-        "training_session": {
-            "name": "🎓 Training Session",
-            "category": "Training",
-            "slide_count": 15,
-            "tone": "Educational",
-            "audience": "Students",
-            "theme": "Pastel Soft",
-            "image_mode": "With Images",
-            "language": "English",
-            "description": "Educational content with clear structure"
-        },
-        "sales_pitch": {
-            "name": "💼 Sales Pitch",
-            "category": "Sales",
-            "slide_count": 8,
-            "tone": "Persuasive",
-            "audience": "Clients",
-            "theme": "Professional Green",
-            "image_mode": "With Images",
-            "language": "English",
-            "description": "Compelling sales presentation format"
-        },
-        "tech_overview": {
-            "name": "🔧 Technical Overview",
-            "category": "Technical",
-            "slide_count": 10,
-            "tone": "Neutral",
-            "audience": "Managers",
-            "theme": "Minimal Dark",
-            "image_mode": "With Images",
-            "language": "English",
-            "description": "Technical documentation and overview"
-        },
-        "marketing_campaign": {
-            "name": "📣 Marketing Campaign",
-            "category": "Marketing",
-            "slide_count": 9,
-            "tone": "Inspirational",
-            "audience": "Corporate",
-            "theme": "Elegant Purple",
-            "image_mode": "With Images",
-            "language": "English",
-            "description": "Creative marketing strategy presentation"
-        }
-    }
+    return PRESET_TEMPLATES
+
+# ============================================================================
+# HTTP SESSION
+# ============================================================================
+
+# Fail fast on unreachable hosts (3s connect) but allow slow responses to stream in
+HTTP_CONNECT_TIMEOUT = 3.05
+
+@st.cache_resource
+def get_http_session():
+    """Pooled keep-alive HTTP session shared by AI and image requests"""
+    session = requests.Session()
+    # Retry dropped connections and gateway errors; POSTs to the AI APIs are not retried.
+    # Retry-After is ignored: urllib3 would sleep for all of it, stalling an image worker and the deck build
+    retries = Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), raise_on_status=False,
+                    respect_retry_after_header=False)
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 # ============================================================================
 # IMAGE GENERATION FUNCTIONS
@@ -413,34 +752,88 @@ def get_preset_templates():
 
 def generate_topic_search_terms(main_topic, slide_title, image_prompt):
     """Generate search terms prioritizing topic relevance"""
-    search_terms = []
-    
-    if image_prompt and image_prompt.strip():
-        search_terms.append(image_prompt.strip())
-    
-    if main_topic and slide_title:
-        search_terms.append(f"{main_topic} {slide_title}")
-    
-    if slide_title:
-        search_terms.append(slide_title)
-    
-    if main_topic:
-        search_terms.append(main_topic)
-    
-    seen = set()
-    unique = []
-    for term in search_terms:
-        lower = term.lower().strip()
-        if lower and lower not in seen:
-            seen.add(lower)
-            unique.append(term)
+    candidates = (
+        image_prompt,
+        f"{main_topic} {slide_title}" if main_topic and slide_title else None,
+        slide_title,
+        main_topic
+    )
+    
+    # Later duplicates (case-insensitive) keep the first term's position and spelling
+    unique = {}
+    for term in candidates:
+        term = term.strip() if term else ""
+        if term:
+            unique.setdefault(term.lower(), term)
+    
+    return list(unique.values())
+
+IMAGE_PEEK_BYTES = 64 * 1024
+IMAGE_MAX_BYTES = 2_000_000
+
+def read_capped(chunks, data):
+    """Append the remaining chunks to data; False if the image outgrows IMAGE_MAX_BYTES"""
+    for chunk in chunks:
+        data += chunk
+        if len(data) > IMAGE_MAX_BYTES:
+            return False
+    return True
+
+def download_image(url, min_width, min_height, timeout=(HTTP_CONNECT_TIMEOUT, 10), headers=None, cache=True):
+    """Stream an image, stopping after its header if it is too small or too large to use"""
+    from PIL import Image
+    
+    # Different searches often land on the same picture; fetch each URL once.
+    # cache=False is for URLs that serve a different image on every request
+    key = ('url', url, min_width, min_height)
+    cached = get_cached_image(key) if cache else None
+    if cached:
+        return cached
+    
+    with get_http_session().get(url, timeout=timeout, headers=headers, stream=True) as response:
+        if response.status_code != 200:
+            return None
+        
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > IMAGE_MAX_BYTES:
+            return None
+        
+        chunks = response.iter_content(chunk_size=16384)
+        data = bytearray()
+        for chunk in chunks:
+            data += chunk
+            if len(data) >= IMAGE_PEEK_BYTES:
+                break
+        
+        try:
+            width, height = Image.open(io.BytesIO(data)).size
+        except Exception:
+            # Header did not fit in the peeked bytes; size up the whole body instead
+            if not read_capped(chunks, data):
+                return None
+            try:
+                width, height = Image.open(io.BytesIO(data)).size
+            except Exception:
+                return None
+        
+        if width <= min_width or height <= min_height:
+            return None
+        
+        if not read_capped(chunks, data):
+            return None
     
-    return unique
+    if len(data) <= 5000:
+        return None
+    image_data = bytes(data)
+    if cache:
+        store_cached_image(key, image_data)
+    return image_data
 
 def get_google_image(query, api_key, cx):
     """Get image using Google Custom Search API"""
     try:
-        st.session_state.google_searches_used += 1
+        with get_google_search_lock():
+            st.session_state.google_searches_used += 1
         
         url = "https://www.googleapis.com/customsearch/v1"
         
@@ -456,23 +849,19 @@ def get_google_image(query, api_key, cx):
             'fileType': 'jpg,png'
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = get_http_session().get(url, params=params, timeout=(HTTP_CONNECT_TIMEOUT, 10))
         
         if response.status_code == 200:
-            data = response.json()
+            data = json_loads(response.content)
             
             if 'items' in data and len(data['items']) > 0:
                 for item in data['items'][:3]:
                     try:
-                        image_url = item['link']
-                        img_response = requests.get(image_url, timeout=10, headers={
+                        image_data = download_image(item['link'], 300, 200, headers={
                             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
                         })
-                        
-                        if img_response.status_code == 200 and len(img_response.content) > 5000:
-                            img = Image.open(io.BytesIO(img_response.content))
-                            if img.size[0] > 300 and img.size[1] > 200:
-                                return img_response.content
+                        if image_data:
+                            return image_data
                     except:
                         continue
         
@@ -490,16 +879,7 @@ def get_unsplash_image(query, width=800, height=600):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        response = requests.get(url, timeout=15, allow_redirects=True, headers=headers)
-        
-        if response.status_code == 200 and len(response.content) > 5000:
-            try:
-                img = Image.open(io.BytesIO(response.content))
-                if img.size[0] > 400 and img.size[1] > 300:
-                    return response.content
-            except:
-                pass
-        return None
+        return download_image(url, 400, 300, timeout=(HTTP_CONNECT_TIMEOUT, 15), headers=headers, cache=False)
     except:
         return None
 
@@ -517,53 +897,130 @@ def get_pexels_image(query, api_key):
             "orientation": "landscape"
         }
         
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = get_http_session().get(url, headers=headers, params=params, timeout=(HTTP_CONNECT_TIMEOUT, 10))
         
         if response.status_code == 200:
-            data = response.json()
+            data = json_loads(response.content)
             if data.get("photos"):
                 photo = data["photos"][0]
                 img_url = photo["src"]["large"]
                 
-                img_response = requests.get(img_url, timeout=10)
-                if img_response.status_code == 200:
-                    return img_response.content
+                return download_image(img_url, 0, 0)
         return None
     except:
         return None
 
+IMAGE_CACHE_MAX = 256
+IMAGE_SEARCH_WINDOW = 3
+IMAGE_SEARCH_HEDGE_DELAY = 1.5
+
+@st.cache_resource
+def get_image_cache():
+    """Slide image cache and its lock, shared across reruns"""
+    return {}, threading.Lock()
+
+@st.cache_resource
+def get_image_search_executor():
+    """Thread pool for concurrent image provider requests, shared across reruns"""
+    return ThreadPoolExecutor(max_workers=24)
+
+@st.cache_resource
+def get_google_search_lock():
+    """Guards the Google search counter, which image worker threads update concurrently"""
+    return threading.Lock()
+
+def get_cached_image(key):
+    """Look up an image in the shared image cache"""
+    cache, lock = get_image_cache()
+    with lock:
+        return cache.get(key)
+
+def store_cached_image(key, image_data):
+    """Add an image to the shared image cache, evicting the oldest entry when full"""
+    cache, lock = get_image_cache()
+    with lock:
+        if len(cache) >= IMAGE_CACHE_MAX:
+            cache.pop(next(iter(cache)))
+        cache[key] = image_data
+
 def get_topic_relevant_image(main_topic, slide_title, image_prompt, google_api_key, google_cx, use_unsplash, use_pexels, pexels_key):
+    """Get highly relevant image, reusing images already fetched for the same slide"""
+    key = (main_topic, slide_title, image_prompt)
+    image_data = get_cached_image(key)
+    if image_data:
+        return image_data
+    
+    image_data = find_topic_relevant_image(main_topic, slide_title, image_prompt, google_api_key, google_cx, use_unsplash, use_pexels, pexels_key)
+    
+    if image_data:
+        store_cached_image(key, image_data)
+    return image_data
+
+def find_topic_relevant_image(main_topic, slide_title, image_prompt, google_api_key, google_cx, use_unsplash, use_pexels, pexels_key):
     """Get highly relevant image using Google + fallbacks"""
     
     search_terms = generate_topic_search_terms(main_topic, slide_title, image_prompt)
     
-    for i, term in enumerate(search_terms, 1):
+    # Provider requests in priority order
+    attempts = []
+    for term in search_terms:
         if google_api_key and google_cx:
-            image_data = get_google_image(term, google_api_key, google_cx)
-            if image_data:
-                return image_data
-        
+            attempts.append((get_google_image, (term, google_api_key, google_cx)))
         if use_pexels and pexels_key:
-            image_data = get_pexels_image(term, pexels_key)
-            if image_data:
-                return image_data
-        
+            attempts.append((get_pexels_image, (term, pexels_key)))
         if use_unsplash:
-            image_data = get_unsplash_image(term)
-            if image_data:
-                return image_data
+            attempts.append((get_unsplash_image, (term,)))
     
     fallback = main_topic.split()[0] if main_topic else "business"
     
     if google_api_key and google_cx:
-        image_data = get_google_image(fallback, google_api_key, google_cx)
-        if image_data:
-            return image_data
-    
+        attempts.append((get_google_image, (fallback, google_api_key, google_cx)))
     if use_unsplash:
-        image_data = get_unsplash_image(fallback)
+        attempts.append((get_unsplash_image, (fallback,)))
+    
+    executor = get_image_search_executor()
+    ctx = get_script_run_ctx()
+    
+    def run_attempt(fetch, args):
+        # Search terms repeat across slides and decks, so results are cached per provider and query;
+        # Unsplash Source returns a random photo per request, so caching it would repeat one picture
+        cacheable = fetch is not get_unsplash_image
+        key = (fetch.__name__, args[0].lower().strip())
+        image_data = get_cached_image(key) if cacheable else None
         if image_data:
             return image_data
+        
+        add_script_run_ctx(threading.current_thread(), ctx)
+        image_data = fetch(*args)
+        if image_data and cacheable:
+            store_cached_image(key, image_data)
+        return image_data
+    
+    remaining = iter(attempts)
+    pending = []
+    
+    def start_next():
+        attempt = next(remaining, None)
+        if attempt:
+            pending.append(executor.submit(run_attempt, *attempt))
+    
+    # Ask providers in priority order. The next one starts only when those ahead of it have
+    # failed or are slow to answer, so a quick hit never spends lower-priority quota
+    start_next()
+    try:
+        while pending:
+            wait([future for future in pending if not future.done()],
+                 timeout=IMAGE_SEARCH_HEDGE_DELAY, return_when=FIRST_COMPLETED)
+            # Failed attempts drop out; a hit wins once nothing ahead of it is still running
+            pending[:] = [future for future in pending if not future.done() or future.result()]
+            if pending and pending[0].done():
+                return pending[0].result()
+            if not any(future.done() for future in pending) and len(pending) < IMAGE_SEARCH_WINDOW:
+                start_next()
+    finally:
+        # Attempts still queued behind a busy pool are dropped
+        for future in pending:
+            future.cancel()
     
     return None
 
@@ -571,6 +1028,25 @@ def get_topic_relevant_image(main_topic, slide_title, image_prompt, google_api_k
 # AI CONTENT GENERATION
 # ============================================================================
 
+SLIDES_CACHE_TTL = 7 * 24 * 3600
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 30.0
+# How long a session waits on another session's identical request before making its own
+INFLIGHT_WAIT_TIMEOUT = 20.0
+
+class RateLimitError(Exception):
+    """The provider answered 429; retry_after is its Retry-After in seconds, or 0"""
+    def __init__(self, retry_after=0.0):
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
+
+class ServerError(Exception):
+    """The provider answered with a 5xx status"""
+
+# Worth another attempt; anything else (bad key, no credits, bad request) fails at once
+RETRYABLE_ERRORS = (RateLimitError, ServerError, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
 def repair_truncated_json(json_text):
     """Attempt to repair truncated JSON from AI response"""
     text = json_text.strip()
@@ -584,7 +1060,7 @@ def repair_truncated_json(json_text):
     text = text.strip()
     
     try:
-        data = json.loads(text)
+        data = json_loads(text)
         return data
     except json.JSONDecodeError:
         pass
@@ -598,45 +1074,76 @@ def repair_truncated_json(json_text):
     if bracket_pos == -1:
         return None
     
-    current_pos = bracket_pos + 1
-    brace_count = 0
-    slide_start = -1
-    
-    while current_pos < len(text):
-        char = text[current_pos]
-        
-        if char == '{' and brace_count == 0:
-            slide_start = current_pos
-            brace_count = 1
-        elif char == '{':
-            brace_count += 1
-        elif char == '}':
-            brace_count -= 1
-            if brace_count == 0 and slide_start != -1:
-                slide_text = text[slide_start:current_pos + 1]
-                try:
-                    slide_obj = json.loads(slide_text)
-                    if 'title' in slide_obj:
-                        if 'bullets' not in slide_obj:
-                            slide_obj['bullets'] = []
-                        if 'image_prompt' not in slide_obj:
-                            slide_obj['image_prompt'] = slide_obj['title']
-                        if 'speaker_notes' not in slide_obj:
-                            slide_obj['speaker_notes'] = ""
-                        slides.append(slide_obj)
-                except:
-                    pass
-                slide_start = -1
+    # Decode each complete slide object in C; the first one that fails to
+    # decode is the truncated tail, so nothing after it is worth scanning
+    decoder = json.JSONDecoder()
+    pos = bracket_pos + 1
+    
+    while pos < len(text):
+        while pos < len(text) and text[pos] in ' ,\n\r\t':
+            pos += 1
+        if pos >= len(text) or text[pos] != '{':
+            break
         
-        current_pos += 1
+        try:
+            slide_obj, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        
+        if isinstance(slide_obj, dict) and 'title' in slide_obj:
+            if 'bullets' not in slide_obj:
+                slide_obj['bullets'] = []
+            if 'image_prompt' not in slide_obj:
+                slide_obj['image_prompt'] = slide_obj['title']
+            if 'speaker_notes' not in slide_obj:
+                slide_obj['speaker_notes'] = ""
+            slides.append(slide_obj)
     
     if slides:
-        return {"slides": slides}
+        # Salvaged decks lack the slides after the cut, so they are not worth caching
+        return {"slides": slides, "truncated": True}
     
     return None
 
+# A completed "title" key; quotes inside string values are escaped, so bullet text never matches
+TITLE_KEY = re.compile(r'"title"\s*:')
+TITLE_KEY_TAIL = 32
+
+def read_streamed_completion(response, slide_count=None):
+    """Collect the message text from an OpenAI-compatible SSE stream"""
+    chunks = []
+    status = st.empty() if slide_count else None
+    slides_seen = 0
+    # Unscanned end of the text, kept so a key split across chunks is still found
+    pending = ""
+    for line in response.iter_lines():
+        if not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        choices = json_loads(payload).get("choices")
+        if choices:
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                chunks.append(content)
+                if status:
+                    pending += content
+                    found = 0
+                    end = 0
+                    for match in TITLE_KEY.finditer(pending):
+                        found += 1
+                        end = match.end()
+                    pending = pending[end:][-TITLE_KEY_TAIL:]
+                    if found:
+                        slides_seen = min(slides_seen + found, slide_count)
+                        status.caption(f"✍️ Writing slide {slides_seen} of {slide_count}...")
+    if status:
+        status.empty()
+    return "".join(chunks)
+
 def generate_content_with_claude(api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key=None, groq_api_key=None):
-    """Generate presentation content using AI"""
+    """Generate presentation content using AI; returns the slides and whether the deck came back whole"""
     try:
         use_grok_api = "Grok" in model_choice and grok_api_key
         use_groq_api = "Groq" in model_choice and groq_api_key
@@ -678,7 +1185,9 @@ def generate_content_with_claude(api_key, topic, category, slide_count, tone, au
                 "Content-Type": "application/json",
             }
         
-        calculated_tokens = min(slide_count * 350 + 500, 4000)
+        # Non-Latin scripts need roughly twice the tokens per word
+        tokens_per_slide = 180 if language == "English" else 350
+        calculated_tokens = min(slide_count * tokens_per_slide + 250, 4000)
         language_instruction = f"Generate ALL content in {language} language." if language != "English" else ""
         
         prompt = f"""{language_instruction}
@@ -712,27 +1221,37 @@ CRITICAL REQUIREMENTS:
 
 Generate {slide_count} slides now:"""
 
-        response = requests.post(
+        response = get_http_session().post(
             api_url,
             headers=headers,
             json={
                 "model": model,
                 "max_tokens": calculated_tokens,
-                "messages": [{"role": "user", "content": prompt}]
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": True
             },
-            timeout=60
+            timeout=(HTTP_CONNECT_TIMEOUT, 60),
+            stream=True
         )
         
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+            raise RateLimitError(float(retry_after) if retry_after and retry_after.isdigit() else 0.0)
+        
+        if response.status_code >= 500:
+            response.close()
+            raise ServerError(f"Server error {response.status_code}")
+        
         if response.status_code == 200:
-            data = response.json()
-            content_text = data["choices"][0]["message"]["content"]
+            content_text = read_streamed_completion(response, slide_count)
             slides_data = repair_truncated_json(content_text)
             
             if slides_data and "slides" in slides_data:
                 slides = slides_data["slides"]
                 
                 if not slides:
-                    return None
+                    return None, False
                 
                 for i, slide in enumerate(slides):
                     if 'bullets' not in slide:
@@ -742,25 +1261,113 @@ Generate {slide_count} slides now:"""
                     if 'speaker_notes' not in slide:
                         slide['speaker_notes'] = ""
                 
-                return slides
-        return None
+                complete = not slides_data.get("truncated") and len(slides) == slide_count
+                return slides, complete
+        else:
+            st.error(f"❌ API error {response.status_code}: {response.text[:200]}")
+        return None, False
+    except RETRYABLE_ERRORS:
+        raise
     except Exception as e:
         st.error(f"Error: {str(e)}")
-        return None
+        return None, False
+
+def slides_cache_key(*params):
+    """Stable cache key for a set of generation parameters"""
+    return hashlib.sha256(json.dumps(params, ensure_ascii=False).encode()).hexdigest()
+
+def get_cached_slides(key):
+    """Return slides generated for key within SLIDES_CACHE_TTL, or None"""
+    with read_conn() as conn:
+        c = conn.cursor()
+        c.execute("SELECT json FROM slides_cache WHERE key = ? AND ts > ?",
+                  (key, int(time.time()) - SLIDES_CACHE_TTL))
+        row = c.fetchone()
+        return json_loads(row[0]) if row else None
 
-def generate_content_with_retry(api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key=None, groq_api_key=None, max_retries=3):
-    """Generate content with automatic retry"""
+def store_cached_slides(key, slides):
+    """Remember generated slides and drop expired entries"""
+    now = int(time.time())
+    def fn(conn):
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO slides_cache (key, json, ts) VALUES (?, ?, ?)",
+                         (key, json_dumps(slides), now))
+            conn.execute("DELETE FROM slides_cache WHERE ts <= ?", (now - SLIDES_CACHE_TTL,))
+    run_write(fn)
+
+@st.cache_resource
+def get_inflight_generations():
+    """Futures for generations in progress, keyed like slides_cache, and their lock"""
+    return {}, threading.Lock()
+
+def generate_content_with_retry(api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key=None, groq_api_key=None, max_retries=3, use_cache=True):
+    """Generate content with automatic retry, reusing identical recent or in-flight requests"""
+    # API keys stay out of the key: the same request gives the same deck whoever pays for it
+    key = slides_cache_key(topic, category, slide_count, tone, audience, key_points, model_choice, language)
+    # A forced regeneration skips the stored deck; its result replaces that deck in the cache
+    cached = get_cached_slides(key) if use_cache else None
+    if cached:
+        return cached
+    
+    # Another session asking for the same deck meanwhile waits for this call, up to INFLIGHT_WAIT_TIMEOUT
+    inflight, lock = get_inflight_generations()
+    with lock:
+        future = inflight.get(key)
+        leader = future is None
+        if leader:
+            future = inflight[key] = Future()
+    
+    if not leader:
+        status = st.empty()
+        status.caption("⏳ The same presentation is already being generated, waiting for it...")
+        try:
+            result = future.result(timeout=INFLIGHT_WAIT_TIMEOUT)
+        except Exception:
+            result = None
+        status.empty()
+        if result:
+            # Each session gets its own copy to edit
+            return deepcopy(result)
+        # The first call failed, perhaps only for its own API key, or is still retrying; try with ours
+        return request_slides_with_retry(key, api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key, groq_api_key, max_retries)
+    
+    try:
+        result = request_slides_with_retry(key, api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key, groq_api_key, max_retries)
+        future.set_result(deepcopy(result))
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        # A Streamlit stop or rerun in this session must not reach the waiting sessions
+        if not future.done():
+            future.set_result(None)
+        with lock:
+            inflight.pop(key, None)
+
+def request_slides_with_retry(key, api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key, groq_api_key, max_retries):
+    """Call the provider until it succeeds or fails for good, caching a complete deck under key"""
     for attempt in range(max_retries):
         try:
-            result = generate_content_with_claude(api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key, groq_api_key)
-            if result:
-                return result
-        except Exception as e:
-            if "Rate limit" in str(e):
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 5
-                    st.warning(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+            result, complete = generate_content_with_claude(api_key, topic, category, slide_count, tone, audience, key_points, model_choice, language, grok_api_key, groq_api_key)
+        except RETRYABLE_ERRORS as e:
+            retry_after = getattr(e, 'retry_after', 0.0)
+            # Sleeping blocks the script thread and any coalesced callers, so long waits are not worth it
+            if retry_after > RETRY_BACKOFF_CAP:
+                st.error(f"❌ Rate limited: the provider asks to wait {retry_after:.0f}s. Please try again later.")
+                return None
+            if attempt < max_retries - 1:
+                # Full jitter spreads retries from concurrent users; never retry before the server allows
+                wait_time = max(random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** attempt)), retry_after)
+                st.warning(f"⏳ {e.__class__.__name__}, retrying in {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            continue
+        # None means a failure that retrying will not fix, already reported.
+        # Short or salvaged decks are still shown but not cached, so the next request tries again
+        if result and complete:
+            store_cached_slides(key, result)
+        return result
+    st.error("❌ The AI provider is not responding. Please try again in a minute.")
     return None
 
 # ============================================================================
@@ -774,7 +1381,7 @@ def analyze_presentation(slides_content):
     score = 100
     
     for i, slide in enumerate(slides_content, 1):
-        bullet_count = len(slide.get('bullets', []))
+        bullet_count = len(slide.get('bullets') or ())
         if bullet_count > 5:
             issues.append(f"Slide {i}: Too many bullets ({bullet_count})")
             suggestions.append(f"Slide {i}: Reduce to 3-5 key points")
@@ -795,24 +1402,21 @@ def analyze_presentation(slides_content):
 
 def export_to_pdf(slides_content, topic):
     """Export to PDF"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, pageCompression=1)
     styles = getSampleStyleSheet()
-    story = []
+    title_style, heading_style, body_style = styles['Title'], styles['Heading2'], styles['BodyText']
     
-    title = Paragraph(f"<b>{topic}</b>", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
+    story = [Paragraph(f"<b>{topic}</b>", title_style), Spacer(1, 12)]
     
     for i, slide in enumerate(slides_content, 1):
-        slide_title = Paragraph(f"<b>Slide {i}: {slide['title']}</b>", styles['Heading2'])
-        story.append(slide_title)
+        story.append(Paragraph(f"<b>Slide {i}: {slide['title']}</b>", heading_style))
         story.append(Spacer(1, 6))
-        
-        for bullet in slide.get('bullets', []):
-            bullet_text = Paragraph(f"• {bullet}", styles['BodyText'])
-            story.append(bullet_text)
-        
+        story.extend(Paragraph(f"• {bullet}", body_style) for bullet in slide.get('bullets', []))
         story.append(Spacer(1, 20))
     
     doc.build(story)
@@ -836,124 +1440,171 @@ def export_to_google_slides_json(slides_content, topic, theme):
         }
         google_slides_data['slides'].append(google_slide)
     
-    return json.dumps(google_slides_data, indent=2)
+    return json_dumps_pretty(google_slides_data)
 
 # ============================================================================
 # POWERPOINT CREATION
 # ============================================================================
 
+THEMES = {
+    "Corporate Blue": {"bg": RGBColor(240, 248, 255), "accent": RGBColor(31, 119, 180), "text": RGBColor(0, 0, 0)},
+    "Gradient Modern": {"bg": RGBColor(240, 242, 246), "accent": RGBColor(138, 43, 226), "text": RGBColor(0, 0, 0)},
+    "Minimal Dark": {"bg": RGBColor(30, 30, 30), "accent": RGBColor(255, 215, 0), "text": RGBColor(255, 255, 255)},
+    "Pastel Soft": {"bg": RGBColor(255, 250, 240), "accent": RGBColor(255, 182, 193), "text": RGBColor(60, 60, 60)},
+    "Professional Green": {"bg": RGBColor(245, 255, 250), "accent": RGBColor(34, 139, 34), "text": RGBColor(0, 0, 0)},
+    "Elegant Purple": {"bg": RGBColor(250, 245, 255), "accent": RGBColor(128, 0, 128), "text": RGBColor(0, 0, 0)}
+}
+
+IMAGE_BOXES = {
+    "Right Side": {"left": Inches(6.5), "top": Inches(2), "width": Inches(3)},
+    "Left Side": {"left": Inches(0.5), "top": Inches(2), "width": Inches(3)},
+    "Top Right Corner": {"left": Inches(8), "top": Inches(0.5), "width": Inches(1.5)},
+    "Bottom": {"left": Inches(3.5), "top": Inches(5.5), "width": Inches(3)},
+    "Center": {"left": Inches(3.5), "top": Inches(2.5), "width": Inches(3)}
+}
+
+# Geometry and font sizes shared by every slide; tuple boxes are (left, top, width, height)
+LOGO_BOX = {"left": Inches(9), "top": Inches(0.2), "width": Inches(0.8)}
+TITLE_BOX = (Inches(0.5), Inches(0.5), Inches(8.5), Inches(1))
+SUBTITLE_BOX = (Inches(0.5), Inches(3), Inches(9), Inches(1))
+BULLET_LEFT, BULLET_TOP, BULLET_HEIGHT = Inches(0.5), Inches(2), Inches(4.5)
+BULLET_WIDTH, BULLET_WIDTH_BESIDE_IMAGE = Inches(9), Inches(5.5)
+TITLE_SLIDE_TITLE_SIZE, TITLE_SIZE, SUBTITLE_SIZE = Pt(36), Pt(28), Pt(20)
+BULLET_SIZE, BULLET_SPACING = Pt(18), Pt(12)
+
+def shrink_image(image_data, max_size=900):
+    """Downscale and re-encode an image as JPEG before embedding it in a slide"""
+    from PIL import Image
+    
+    try:
+        img = Image.open(io.BytesIO(image_data)).convert('RGB')
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=82, optimize=True)
+        buffer.seek(0)
+        return buffer
+    except Exception:
+        return io.BytesIO(image_data)
+
 def create_powerpoint(slides_content, theme, image_mode, google_api_key, google_cx, use_unsplash, use_pexels, pexels_key, category, audience, topic, image_position, logo_data, show_progress=True):
     """Create PowerPoint presentation"""
     prs = Presentation()
     prs.slide_width = Inches(10)
     prs.slide_height = Inches(7.5)
     
-    themes = {
-        "Corporate Blue": {"bg": RGBColor(240, 248, 255), "accent": RGBColor(31, 119, 180), "text": RGBColor(0, 0, 0)},
-        "Gradient Modern": {"bg": RGBColor(240, 242, 246), "accent": RGBColor(138, 43, 226), "text": RGBColor(0, 0, 0)},
-        "Minimal Dark": {"bg": RGBColor(30, 30, 30), "accent": RGBColor(255, 215, 0), "text": RGBColor(255, 255, 255)},
-        "Pastel Soft": {"bg": RGBColor(255, 250, 240), "accent": RGBColor(255, 182, 193), "text": RGBColor(60, 60, 60)},
-        "Professional Green": {"bg": RGBColor(245, 255, 250), "accent": RGBColor(34, 139, 34), "text": RGBColor(0, 0, 0)},
-        "Elegant Purple": {"bg": RGBColor(250, 245, 255), "accent": RGBColor(128, 0, 128), "text": RGBColor(0, 0, 0)}
-    }
-    
-    color_scheme = themes.get(theme, themes["Corporate Blue"])
-    
-    positions = {
-        "Right Side": {"left": Inches(6.5), "top": Inches(2), "width": Inches(3)},
-        "Left Side": {"left": Inches(0.5), "top": Inches(2), "width": Inches(3)},
-        "Top Right Corner": {"left": Inches(8), "top": Inches(0.5), "width": Inches(1.5)},
-        "Bottom": {"left": Inches(3.5), "top": Inches(5.5), "width": Inches(3)},
-        "Center": {"left": Inches(3.5), "top": Inches(2.5), "width": Inches(3)}
-    }
+    color_scheme = THEMES.get(theme, THEMES["Corporate Blue"])
+    img_pos = IMAGE_BOXES.get(image_position, IMAGE_BOXES["Right Side"])
+    bullet_width = BULLET_WIDTH_BESIDE_IMAGE if image_mode == "With Images" else BULLET_WIDTH
+    # One stream rewound per slide; python-pptx stores the identical bytes as a single part
+    logo_stream = io.BytesIO(logo_data) if logo_data else None
+    bullet_ppr = None
     
-    img_pos = positions.get(image_position, positions["Right Side"])
+    # Every slide inherits the background from the master, so it is set once
+    master_fill = prs.slide_master.background.fill
+    master_fill.solid()
+    master_fill.fore_color.rgb = color_scheme["bg"]
+    blank_slide_layout = prs.slide_layouts[6]
     
     if show_progress:
         progress_bar = st.progress(0)
         status_text = st.empty()
     
-    for idx, slide_data in enumerate(slides_content):
-        if show_progress:
-            status_text.text(f"Creating slide {idx + 1}/{len(slides_content)}...")
-            progress_bar.progress((idx + 1) / len(slides_content))
-        
-        blank_slide_layout = prs.slide_layouts[6]
-        slide = prs.slides.add_slide(blank_slide_layout)
-        
-        background = slide.background
-        fill = background.fill
-        fill.solid()
-        fill.fore_color.rgb = color_scheme["bg"]
-        
-        if logo_data:
-            try:
-                logo_stream = io.BytesIO(logo_data)
-                slide.shapes.add_picture(logo_stream, Inches(9), Inches(0.2), width=Inches(0.8))
-            except:
-                pass
-        
-        title_box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(8.5), Inches(1))
-        title_frame = title_box.text_frame
-        title_frame.text = slide_data["title"]
-        title_frame.paragraphs[0].font.size = Pt(36 if idx == 0 else 28)
-        title_frame.paragraphs[0].font.bold = True
-        title_frame.paragraphs[0].font.color.rgb = color_scheme["accent"]
-        title_frame.paragraphs[0].alignment = PP_ALIGN.CENTER if idx == 0 else PP_ALIGN.LEFT
-        
-        if idx > 0 and slide_data.get("bullets"):
-            bullet_width = Inches(5.5) if image_mode == "With Images" else Inches(9)
-            bullet_box = slide.shapes.add_textbox(Inches(0.5), Inches(2), bullet_width, Inches(4.5))
-            text_frame = bullet_box.text_frame
-            text_frame.word_wrap = True
-            
-            for bullet in slide_data["bullets"]:
-                p = text_frame.add_paragraph()
-                p.text = bullet
-                p.level = 0
-                p.font.size = Pt(18)
-                p.font.color.rgb = color_scheme["text"]
-                p.space_after = Pt(12)
-        
-        if idx == 0:
-            subtitle_box = slide.shapes.add_textbox(Inches(0.5), Inches(3), Inches(9), Inches(1))
-            subtitle_frame = subtitle_box.text_frame
-            subtitle_frame.text = f"{category} Presentation | {audience}"
-            subtitle_frame.paragraphs[0].font.size = Pt(20)
-            subtitle_frame.paragraphs[0].font.color.rgb = color_scheme["text"]
-            subtitle_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
-        
-        if slide_data.get("speaker_notes"):
-            notes_slide = slide.notes_slide
-            notes_slide.notes_text_frame.text = slide_data["speaker_notes"]
-        
-        if idx > 0 and image_mode == "With Images":
-            image_prompt = slide_data.get("image_prompt", "")
-            
+    image_futures = []
+    executor = None
+    if image_mode == "With Images" and len(slides_content) > 1:
+        def fetch_slide_image(slide_data):
             image_data = get_topic_relevant_image(
                 main_topic=topic,
                 slide_title=slide_data["title"],
-                image_prompt=image_prompt,
+                image_prompt=slide_data.get("image_prompt", ""),
                 google_api_key=google_api_key,
                 google_cx=google_cx,
                 use_unsplash=use_unsplash,
                 use_pexels=use_pexels,
                 pexels_key=pexels_key
             )
-            
-            if image_data:
+            # Resizing here keeps the decode off the slide-building thread
+            return shrink_image(image_data) if image_data else None
+        
+        image_slides = slides_content[1:]
+        
+        # Workers share this run's context so they can update session state;
+        # they download while the slides below are being built
+        ctx = get_script_run_ctx()
+        executor = ThreadPoolExecutor(max_workers=min(len(image_slides), 8), initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+        image_futures = [executor.submit(fetch_slide_image, slide_data) for slide_data in image_slides]
+    
+    # Stop queued downloads if building fails or Streamlit stops the run for a rerun,
+    # so they do not keep spending provider quota
+    try:
+        for idx, slide_data in enumerate(slides_content):
+            if show_progress:
+                status_text.text(f"Creating slide {idx + 1}/{len(slides_content)}...")
+                progress_bar.progress((idx + 1) / len(slides_content))
+        
+            slide = prs.slides.add_slide(blank_slide_layout)
+        
+            if logo_stream:
                 try:
-                    image_stream = io.BytesIO(image_data)
-                    slide.shapes.add_picture(
-                        image_stream, 
-                        img_pos["left"], 
-                        img_pos["top"], 
-                        width=img_pos["width"]
-                    )
+                    logo_stream.seek(0)
+                    slide.shapes.add_picture(logo_stream, LOGO_BOX["left"], LOGO_BOX["top"], width=LOGO_BOX["width"])
                 except:
                     pass
+        
+            title_box = slide.shapes.add_textbox(*TITLE_BOX)
+            title_frame = title_box.text_frame
+            title_frame.text = slide_data["title"]
+            title_frame.paragraphs[0].font.size = TITLE_SLIDE_TITLE_SIZE if idx == 0 else TITLE_SIZE
+            title_frame.paragraphs[0].font.bold = True
+            title_frame.paragraphs[0].font.color.rgb = color_scheme["accent"]
+            title_frame.paragraphs[0].alignment = PP_ALIGN.CENTER if idx == 0 else PP_ALIGN.LEFT
+        
+            if idx > 0 and slide_data.get("bullets"):
+                bullet_box = slide.shapes.add_textbox(BULLET_LEFT, BULLET_TOP, bullet_width, BULLET_HEIGHT)
+                text_frame = bullet_box.text_frame
+                text_frame.word_wrap = True
             
-            time.sleep(0.3)
+                for bullet in slide_data["bullets"]:
+                    p = text_frame.add_paragraph()
+                    p.text = bullet
+                    if bullet_ppr is None:
+                        p.level = 0
+                        p.font.size = BULLET_SIZE
+                        p.font.color.rgb = color_scheme["text"]
+                        p.space_after = BULLET_SPACING
+                        bullet_ppr = p._p.get_or_add_pPr()
+                    else:
+                        # Every bullet is styled alike, so copy the first one's properties element
+                        p._p.insert(0, deepcopy(bullet_ppr))
+        
+            if idx == 0:
+                subtitle_box = slide.shapes.add_textbox(*SUBTITLE_BOX)
+                subtitle_frame = subtitle_box.text_frame
+                subtitle_frame.text = f"{category} Presentation | {audience}"
+                subtitle_frame.paragraphs[0].font.size = SUBTITLE_SIZE
+                subtitle_frame.paragraphs[0].font.color.rgb = color_scheme["text"]
+                subtitle_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
+        
+            if slide_data.get("speaker_notes"):
+                notes_slide = slide.notes_slide
+                notes_slide.notes_text_frame.text = slide_data["speaker_notes"]
+        
+            if idx > 0 and image_mode == "With Images":
+                image_stream = image_futures[idx - 1].result()
+            
+                if image_stream:
+                    try:
+                        slide.shapes.add_picture(
+                            image_stream, 
+                            img_pos["left"], 
+                            img_pos["top"], 
+                            width=img_pos["width"]
+                        )
+                    except:
+                        pass
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
     
     if show_progress:
         progress_bar.progress(1.0)
@@ -961,6 +1612,19 @@ def create_powerpoint(slides_content, theme, image_mode, google_api_key, google_
     
     return prs
 
+# Image decks run to several MB each, so only the most recent few stay in memory
+@st.cache_data(ttl=3600, max_entries=8, show_spinner=False)
+def build_presentation_bytes(slides_json, theme, image_mode, google_api_key, google_cx, use_unsplash, use_pexels, pexels_key, category, audience, topic, image_position, logo_data):
+    """Create the presentation once per distinct input and return the .pptx bytes"""
+    prs = create_powerpoint(
+        json_loads(slides_json), theme, image_mode,
+        google_api_key, google_cx, use_unsplash, use_pexels, pexels_key,
+        category, audience, topic, image_position, logo_data
+    )
+    pptx_io = io.BytesIO()
+    prs.save(pptx_io)
+    return pptx_io.getvalue()
+
 # ============================================================================
 # LOGIN PAGE
 # ============================================================================
@@ -1021,6 +1685,308 @@ def show_login_page():
         
         st.markdown('</div>', unsafe_allow_html=True)
 
+# ============================================================================
+# CARD TEMPLATES
+# ============================================================================
+
+ONLINE_USER_CARD_TMPL = """
+<div style='background:#e8f5e9;padding:15px;border-radius:8px;margin:10px 0;'>
+    <span class='online-indicator'></span>
+    <b>{username}</b> ({role})<br>
+    <small>📧 {email} | 🕒 {login_time}</small><br>
+    <small>📊 {total_presentations} ppts | 📄 {total_slides} slides</small>
+</div>"""
+
+HISTORY_CARD_TMPL = """
+<div class='activity-card'>
+    <b>📊 {topic}</b><br>
+    <small>📄 {slides_count} slides | 🕒 {timestamp}</small>
+</div>"""
+
+# ============================================================================
+# ADMIN FRAGMENTS
+# ============================================================================
+
+@st.fragment(run_every="15s")
+def show_live_dashboard():
+    """Live user activity, refreshed on its own without rerunning the page"""
+    st.markdown("### 🟢 Live User Activity")
+    
+    # Clicking a button inside the fragment reruns only the fragment
+    if st.button("🔄 Refresh", key="admin_refresh"):
+        get_currently_logged_in_users.clear()
+    
+    active_users = get_currently_logged_in_users()
+    
+    if active_users:
+        st.success(f"**{len(active_users)} user(s) online**")
+        
+        stats_by_id = get_stats_for_users(tuple(user[0] for user in active_users))
+        empty_stats = {'total_presentations': 0, 'total_slides': 0, 'total_logins': 0}
+        
+        cards = []
+        for user in active_users:
+            user_id, username, email, login_time, role = user
+            user_activity_stats = stats_by_id.get(user_id, empty_stats)
+            
+            cards.append(ONLINE_USER_CARD_TMPL.format(
+                username=username,
+                role=role,
+                email=email if email else 'N/A',
+                login_time=login_time,
+                total_presentations=user_activity_stats['total_presentations'],
+                total_slides=user_activity_stats['total_slides']
+            ))
+        
+        st.markdown("\n".join(cards), unsafe_allow_html=True)
+    else:
+        st.warning("No users online")
+
+@st.fragment
+def show_manage_users():
+    """User table and enable/disable/delete actions, rerun on their own"""
+    st.markdown("### 👥 All Users")
+    
+    df_users = get_all_users()
+    st.dataframe(df_users, use_container_width=True)
+    
+    st.markdown("---")
+    with st.form("user_action_form"):
+        col_m1, col_m2, col_m3 = st.columns(3)
+        with col_m1:
+            user_id_action = st.number_input("User ID", min_value=1, step=1)
+        with col_m2:
+            action_type = st.selectbox("Action", ["Enable", "Disable", "Delete"])
+        with col_m3:
+            st.write("")
+            submitted = st.form_submit_button("▶️ Execute", type="primary")
+    
+    if submitted and user_id_action != 1:
+        # The helpers clear get_all_users, so the rerun shows fresh data
+        if action_type == "Enable":
+            toggle_user_status(user_id_action, 1)
+            st.toast("User enabled", icon="✅")
+        elif action_type == "Disable":
+            toggle_user_status(user_id_action, 0)
+            st.toast("User disabled", icon="⚠️")
+        elif action_type == "Delete":
+            delete_user(user_id_action)
+            st.toast("User deleted", icon="🗑️")
+        st.rerun(scope="fragment")
+
+@st.fragment
+def show_create_user():
+    """Create-user form, submitted without rerunning the page"""
+    st.markdown("### ➕ Create User")
+    
+    with st.form("admin_create_user"):
+        col_a, col_b = st.columns(2)
+        with col_a:
+            new_username = st.text_input("Username *")
+            new_email = st.text_input("Email")
+        with col_b:
+            new_password = st.text_input("Password *", type="password")
+            confirm_password = st.text_input("Confirm *", type="password")
+        
+        submitted = st.form_submit_button("✅ Create User", type="primary")
+        
+        if submitted:
+            if new_username and new_password == confirm_password and len(new_password) >= 6:
+                if create_user_by_admin(new_username, new_password, new_email):
+                    st.success(f"""
+✅ User Created!
+
+Username: `{new_username}`
+Password: `{new_password}`
+                    """)
+                else:
+                    st.error("Username exists!")
+
+@st.fragment
+def show_activity_log():
+    """Paged activity log; paging reruns only the log"""
+    st.markdown("### 📊 Activity Log")
+    
+    col_page, col_size = st.columns(2)
+    with col_page:
+        page = st.number_input("Page", min_value=1, value=1, step=1, key="activity_page")
+    with col_size:
+        page_size = st.selectbox("Page size", [50, 200, 1000], key="activity_page_size")
+    
+    df_activities = get_all_user_activities(limit=page_size, offset=(page - 1) * page_size)
+    
+    if not df_activities.empty:
+        st.dataframe(df_activities, use_container_width=True, height=600)
+
+# ============================================================================
+# FORM OPTIONS
+# ============================================================================
+
+MODEL_CHOICES = (
+    "Free Model (Google Gemini Flash)",
+    "Free Model (Meta Llama 3.2)",
+    "Free Model (Mistral 7B)",
+    "Groq (Llama 3.3 70B) - FREE & FAST",
+    "Groq (Mixtral 8x7B) - FREE",
+    "Grok-4 Latest (xAI)",
+    "Grok-3 (xAI)",
+    "Grok-2 (xAI)",
+    "Claude 3.5 Sonnet (Paid)"
+)
+CATEGORIES = ("Business", "Pitch", "Marketing", "Technical", "Academic", "Training", "Sales")
+LANGUAGES = ("English", "Hindi (हिंदी)", "Spanish", "French", "German")
+TONES = ("Formal", "Neutral", "Inspirational", "Educational", "Persuasive")
+AUDIENCES = ("Investors", "Students", "Corporate", "Clients", "Managers")
+THEME_NAMES = tuple(THEMES)
+IMAGE_MODES = ("With Images", "No Images")
+IMAGE_POSITIONS = tuple(IMAGE_BOXES)
+EXPORT_FORMATS = ("PowerPoint (.pptx)", "PowerPoint + PDF", "Google Slides (JSON)")
+
+# ============================================================================
+# GENERATE PANEL
+# ============================================================================
+
+def render_generate_panel(key_prefix, sidebar):
+    """Create tab shared by the admin and user dashboards"""
+    st.markdown("### 🚀 Quick Start with Templates")
+    
+    preset_templates = get_preset_templates()
+    cols = st.columns(3)
+    
+    for idx, (key, template) in enumerate(preset_templates.items()):
+        with cols[idx % 3]:
+            if st.button(
+                f"{template['name']}\n{template['description']}", 
+                key=f"{key_prefix}_preset_{key}",
+                use_container_width=True
+            ):
+                st.session_state.selected_template = template
+    
+    st.markdown("---")
+    
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        st.markdown('<div class="form-section">', unsafe_allow_html=True)
+        st.markdown("📝 Content Details", unsafe_allow_html=True)
+        
+        topic = st.text_input("Topic *", placeholder="e.g., AI in Healthcare", key=f"{key_prefix}_topic")
+        
+        t = st.session_state.selected_template or {}
+        default_category = t.get('category', 'Business')
+        default_slides = t.get('slide_count', 6)
+        
+        category = st.selectbox(
+            "Category *", 
+            CATEGORIES,
+            index=CATEGORIES.index(default_category) if default_category in CATEGORIES else 0,
+            key=f"{key_prefix}_category"
+        )
+        
+        col1_1, col1_2 = st.columns(2)
+        with col1_1:
+            slide_count = st.number_input("Slides *", min_value=3, max_value=20, value=default_slides, key=f"{key_prefix}_slides")
+        with col1_2:
+            language = st.selectbox("Language", LANGUAGES, key=f"{key_prefix}_lang")
+        
+        tone = st.selectbox("Tone *", TONES, key=f"{key_prefix}_tone")
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown('<div class="form-section">', unsafe_allow_html=True)
+        st.markdown("🎨 Design & Style", unsafe_allow_html=True)
+        
+        audience = st.selectbox("Target Audience *", AUDIENCES, key=f"{key_prefix}_audience")
+        
+        theme = st.selectbox("Visual Theme *", THEME_NAMES, key=f"{key_prefix}_theme")
+        
+        image_mode = st.selectbox("Image Mode *", IMAGE_MODES, key=f"{key_prefix}_imgmode")
+        
+        if image_mode == "With Images":
+            image_position = st.selectbox("Image Position", IMAGE_POSITIONS, key=f"{key_prefix}_imgpos")
+        else:
+            image_position = "Right Side"
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with st.expander("➕ Additional Options"):
+        key_points = st.text_area("Key Points", placeholder="- Point 1\n- Point 2", key=f"{key_prefix}_keypoints")
+        export_format = st.selectbox("Export Format", EXPORT_FORMATS, key=f"{key_prefix}_export")
+        force_regenerate = st.checkbox("🔄 Force regenerate", help="Ignore a recently generated deck for the same settings",
+                                       key=f"{key_prefix}_force")
+    
+    st.markdown("---")
+    
+    if st.button("🚀 Generate Presentation", use_container_width=True, type="primary", key=f"{key_prefix}_generate"):
+        if topic:
+            model_choice = sidebar['model_choice']
+            has_valid_api = False
+            if "Groq" in model_choice and sidebar['groq_api_key']:
+                has_valid_api = True
+            elif "Grok" in model_choice and sidebar['grok_api_key']:
+                has_valid_api = True
+            elif sidebar['claude_api_key']:
+                has_valid_api = True
+            
+            if has_valid_api:
+                with st.spinner("🤖 Generating your presentation..."):
+                    slides_content = generate_content_with_retry(
+                        sidebar['claude_api_key'], topic, category, slide_count, 
+                        tone, audience, key_points, model_choice, language,
+                        grok_api_key=sidebar['grok_api_key'],
+                        groq_api_key=sidebar['groq_api_key'],
+                        use_cache=not force_regenerate
+                    )
+                    
+                    if slides_content:
+                        log_usage(st.session_state.user['id'], 'generate_presentation', topic, len(slides_content))
+                        
+                        pptx_bytes = build_presentation_bytes(
+                            json.dumps(slides_content, sort_keys=True), theme, image_mode,
+                            sidebar['google_api_key'],
+                            sidebar['google_cx'],
+                            sidebar['use_unsplash'], sidebar['use_pexels'], 
+                            sidebar['pexels_api_key'],
+                            category, audience, topic, 
+                            image_position, sidebar['logo_data']
+                        )
+                        
+                        st.markdown("""
+                        <div class="download-section">
+                            <h2>🎉 Your Presentation is Ready!</h2>
+                        </div>
+                        """, unsafe_allow_html=True)
+                        
+                        st.download_button(
+                            "📥 DOWNLOAD POWERPOINT",
+                            pptx_bytes,
+                            f"{topic.replace(' ', '_')}.pptx",
+                            "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                            use_container_width=True,
+                            type="primary",
+                            on_click="ignore"
+                        )
+                        
+                        st.balloons()
+                        
+                        with st.expander("📄 Preview Slides", expanded=True):
+                            preview = []
+                            for idx, slide in enumerate(slides_content):
+                                preview.append(f"### Slide {idx + 1}: {slide['title']}")
+                                preview.extend(f"• {bullet}" for bullet in slide.get('bullets', []))
+                                preview.append("---")
+                            st.markdown("\n\n".join(preview))
+                        
+                        with st.expander("🎓 AI Coach"):
+                            issues, suggestions, score = analyze_presentation(slides_content)
+                            st.metric("Quality Score", f"{score}/100")
+                            if suggestions:
+                                for suggestion in suggestions:
+                                    st.write(f"• {suggestion}")
+            else:
+                st.error("⚠️ Please configure API keys in sidebar")
+
 # ============================================================================
 # INITIALIZE
 # ============================================================================
@@ -1040,8 +2006,6 @@ if 'slides_content' not in st.session_state:
     st.session_state.slides_content = None
 if 'google_searches_used' not in st.session_state:
     st.session_state.google_searches_used = 0
-if 'templates' not in st.session_state:
-    st.session_state.templates = {}
 if 'selected_template' not in st.session_state:
     st.session_state.selected_template = None
 if 'generation_history' not in st.session_state:
@@ -1052,6 +2016,12 @@ if not st.session_state.logged_in:
     show_login_page()
     st.stop()
 
+# Current user
+current_user = st.session_state.user
+user_id = current_user['id']
+username = current_user['username']
+role = current_user['role']
+
 # ============================================================================
 # PROFESSIONAL CSS
 # ============================================================================
@@ -1176,11 +2146,11 @@ st.markdown("""
 # ============================================================================
 
 with st.sidebar:
-    user_stats = get_user_stats(st.session_state.user['id'])
+    user_stats = get_user_stats(user_id)
     st.markdown(f"""
     <div class='user-info'>
-        <h3>👤 {st.session_state.user['username']}</h3>
-        <p>Role: <b>{st.session_state.user['role'].upper()}</b></p>
+        <h3>👤 {username}</h3>
+        <p>Role: <b>{role.upper()}</b></p>
         <hr>
         <p>📊 Presentations: <b>{user_stats['total_presentations']}</b></p>
         <p>📄 Slides: <b>{user_stats['total_slides']}</b></p>
@@ -1189,8 +2159,7 @@ with st.sidebar:
     """, unsafe_allow_html=True)
     
     if st.button("🚪 Logout", use_container_width=True):
-        logout_user(st.session_state.user['id'])
-        log_usage(st.session_state.user['id'], 'logout')
+        logout_and_log(user_id)
         st.session_state.logged_in = False
         st.session_state.user = None
         st.rerun()
@@ -1200,50 +2169,42 @@ with st.sidebar:
     # API Configuration (for PPT generation - both admin & user)
     st.markdown("### ⚙️ Configuration")
     
-    with st.expander("🔑 API Keys", expanded=True):
-        claude_api_key = st.text_input("OpenRouter API Key", type="password")
-        
-        model_choice = st.selectbox(
-            "AI Model",
-            [
-                "Free Model (Google Gemini Flash)",
-                "Free Model (Meta Llama 3.2)",
-                "Free Model (Mistral 7B)",
-                "Groq (Llama 3.3 70B) - FREE & FAST",
-                "Groq (Mixtral 8x7B) - FREE",
-                "Grok-4 Latest (xAI)",
-                "Grok-3 (xAI)",
-                "Grok-2 (xAI)",
-                "Claude 3.5 Sonnet (Paid)"
-            ]
-        )
-        
-        groq_api_key = None
-        if "Groq" in model_choice:
-            groq_api_key = st.text_input("Groq API Key (FREE)", type="password", key="groq_key")
-            if groq_api_key:
-                st.success("✅ Groq configured!")
-        
-        grok_api_key = None
-        if "Grok" in model_choice:
-            grok_api_key = st.text_input("Grok/xAI API Key", type="password", key="grok_key")
-            if grok_api_key:
-                st.success("✅ Grok configured!")
-    
-    with st.expander("🖼️ Image Configuration"):
-        google_api_key = st.text_input("Google API Key", type="password")
-        google_cx = st.text_input("Google CX ID", placeholder="6386765a3a8ed49a9")
-        
-        if google_api_key and google_cx:
-            st.success("✅ Google configured!")
-        
-        use_unsplash_fallback = st.checkbox("Unsplash", value=True)
-        use_pexels_fallback = st.checkbox("Pexels", value=False)
-        
-        if use_pexels_fallback:
-            pexels_api_key = st.text_input("Pexels API Key", type="password")
-        else:
-            pexels_api_key = None
+    # One rerun per save instead of one per keystroke; key fields that depend
+    # on the model or the Pexels toggle show up after saving those choices
+    with st.form("sidebar_cfg"):
+        with st.expander("🔑 API Keys", expanded=True):
+            claude_api_key = st.text_input("OpenRouter API Key", type="password")
+            
+            model_choice = st.selectbox("AI Model", MODEL_CHOICES)
+            
+            groq_api_key = None
+            if "Groq" in model_choice:
+                groq_api_key = st.text_input("Groq API Key (FREE)", type="password", key="groq_key")
+                if groq_api_key:
+                    st.success("✅ Groq configured!")
+            
+            grok_api_key = None
+            if "Grok" in model_choice:
+                grok_api_key = st.text_input("Grok/xAI API Key", type="password", key="grok_key")
+                if grok_api_key:
+                    st.success("✅ Grok configured!")
+        
+        with st.expander("🖼️ Image Configuration"):
+            google_api_key = st.text_input("Google API Key", type="password")
+            google_cx = st.text_input("Google CX ID", placeholder="6386765a3a8ed49a9")
+            
+            if google_api_key and google_cx:
+                st.success("✅ Google configured!")
+            
+            use_unsplash_fallback = st.checkbox("Unsplash", value=True)
+            use_pexels_fallback = st.checkbox("Pexels", value=False)
+            
+            if use_pexels_fallback:
+                pexels_api_key = st.text_input("Pexels API Key", type="password")
+            else:
+                pexels_api_key = None
+            
+        st.form_submit_button("💾 Save Config", use_container_width=True)
     
     with st.expander("🏢 Branding"):
         logo_file = st.file_uploader("Company Logo", type=["png", "jpg", "jpeg"])
@@ -1252,6 +2213,19 @@ with st.sidebar:
             logo_data = logo_file.read()
             st.success("✅ Logo uploaded!")
     
+    sidebar_settings = {
+        'claude_api_key': claude_api_key,
+        'model_choice': model_choice,
+        'groq_api_key': groq_api_key,
+        'grok_api_key': grok_api_key,
+        'google_api_key': google_api_key,
+        'google_cx': google_cx,
+        'use_unsplash': use_unsplash_fallback,
+        'use_pexels': use_pexels_fallback,
+        'pexels_api_key': pexels_api_key,
+        'logo_data': logo_data
+    }
+    
     st.markdown("---")
     
     # Dashboard Metrics
@@ -1276,7 +2250,7 @@ with st.sidebar:
 # ADMIN DASHBOARD
 # ============================================================================
 
-if st.session_state.user['role'] == 'admin':
+if role == 'admin':
     
     st.markdown('<div class="main-header">👑 Admin Dashboard</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Complete System Management & PPT Generator</div>', unsafe_allow_html=True)
@@ -1321,170 +2295,17 @@ if st.session_state.user['role'] == 'admin':
         
         # CREATE TAB
         with tab1:
-            st.markdown("### 🚀 Quick Start with Templates")
-            
-            preset_templates = get_preset_templates()
-            cols = st.columns(3)
-            selected_preset = None
-            
-            for idx, (key, template) in enumerate(preset_templates.items()):
-                with cols[idx % 3]:
-                    if st.button(
-                        f"{template['name']}\n{template['description']}", 
-                        key=f"admin_preset_{key}",
-                        use_container_width=True
-                    ):
-                        selected_preset = template
-                        st.session_state.selected_template = template
-            
-            st.markdown("---")
-            
-            col1, col2 = st.columns([1, 1])
-            
-            with col1:
-                st.markdown('<div class="form-section">', unsafe_allow_html=True)
-                st.markdown("📝 Content Details", unsafe_allow_html=True)
-                
-                topic = st.text_input("Topic *", placeholder="e.g., AI in Healthcare", key="admin_topic")
-                
-                if st.session_state.selected_template:
-                    t = st.session_state.selected_template
-                    default_category = t.get('category', 'Business')
-                    default_slides = t.get('slide_count', 6)
-                    default_tone = t.get('tone', 'Formal')
-                    default_audience = t.get('audience', 'Corporate')
-                    default_theme = t.get('theme', 'Corporate Blue')
-                    default_image_mode = t.get('image_mode', 'With Images')
-                    default_language = t.get('language', 'English')
-                else:
-                    default_category = 'Business'
-                    default_slides = 6
-                    default_tone = 'Formal'
-                    default_audience = 'Corporate'
-                    default_theme = 'Corporate Blue'
-                    default_image_mode = 'With Images'
-                    default_language = 'English'
-                
-                categories = ["Business", "Pitch", "Marketing", "Technical", "Academic", "Training", "Sales"]
-                category = st.selectbox(
-                    "Category *", 
-                    categories,
-                    index=categories.index(default_category) if default_category in categories else 0,
-                    key="admin_category"
-                )
-                
-                col1_1, col1_2 = st.columns(2)
-                with col1_1:
-                    slide_count = st.number_input("Slides *", min_value=3, max_value=20, value=default_slides, key="admin_slides")
-                with col1_2:
-                    languages = ["English", "Hindi (हिंदी)", "Spanish", "French", "German"]
-                    language = st.selectbox("Language", languages, key="admin_lang")
-                
-                tones = ["Formal", "Neutral", "Inspirational", "Educational", "Persuasive"]
-                tone = st.selectbox("Tone *", tones, key="admin_tone")
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown('<div class="form-section">', unsafe_allow_html=True)
-                st.markdown("🎨 Design & Style", unsafe_allow_html=True)
-                
-                audiences = ["Investors", "Students", "Corporate", "Clients", "Managers"]
-                audience = st.selectbox("Target Audience *", audiences, key="admin_audience")
-                
-                themes_list = ["Corporate Blue", "Gradient Modern", "Minimal Dark", "Pastel Soft", "Professional Green", "Elegant Purple"]
-                theme = st.selectbox("Visual Theme *", themes_list, key="admin_theme")
-                
-                image_modes = ["With Images", "No Images"]
-                image_mode = st.selectbox("Image Mode *", image_modes, key="admin_imgmode")
-                
-                if image_mode == "With Images":
-                    image_position = st.selectbox("Image Position", ["Right Side", "Left Side", "Top Right Corner", "Bottom", "Center"], key="admin_imgpos")
-                else:
-                    image_position = "Right Side"
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            with st.expander("➕ Additional Options"):
-                key_points = st.text_area("Key Points", placeholder="- Point 1\n- Point 2", key="admin_keypoints")
-                export_format = st.selectbox("Export Format", ["PowerPoint (.pptx)", "PowerPoint + PDF", "Google Slides (JSON)"], key="admin_export")
-            
-            st.markdown("---")
-            
-            col_btn1, col_btn2 = st.columns([2, 1])
-            
-            with col_btn1:
-                generate_button = st.button("🚀 Generate Presentation", use_container_width=True, type="primary", key="admin_generate")
-            
-            with col_btn2:
-                save_as_template = st.button("💾 Save as Template", use_container_width=True, key="admin_save_template")
-            
-            if generate_button and topic:
-                has_valid_api = False
-                if "Groq" in model_choice and groq_api_key:
-                    has_valid_api = True
-                elif "Grok" in model_choice and grok_api_key:
-                    has_valid_api = True
-                elif claude_api_key:
-                    has_valid_api = True
-                
-                if has_valid_api:
-                    with st.spinner("🤖 Generating..."):
-                        slides_content = generate_content_with_retry(
-                            claude_api_key, topic, category, slide_count, 
-                            tone, audience, key_points, model_choice, language,
-                            grok_api_key=grok_api_key,
-                            groq_api_key=groq_api_key
-                        )
-                        
-                        if slides_content:
-                            log_usage(st.session_state.user['id'], 'generate_presentation', topic, len(slides_content))
-                            
-                            prs = create_powerpoint(
-                                slides_content, theme, image_mode,
-                                google_api_key if 'google_api_key' in locals() else "",
-                                google_cx if 'google_cx' in locals() else "",
-                                use_unsplash_fallback, use_pexels_fallback, 
-                                pexels_api_key if use_pexels_fallback and 'pexels_api_key' in locals() else None,
-                                category, audience, topic, 
-                                image_position, logo_data
-                            )
-                            
-                            pptx_io = io.BytesIO()
-                            prs.save(pptx_io)
-                            pptx_io.seek(0)
-                            
-                            st.markdown("""
-                            <div class="download-section">
-                                <h2>🎉 Presentation Ready!</h2>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.download_button(
-                                "📥 DOWNLOAD POWERPOINT",
-                                pptx_io.getvalue(),
-                                f"{topic.replace(' ', '_')}.pptx",
-                                "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                                use_container_width=True,
-                                type="primary"
-                            )
-                            
-                            with st.expander("📄 Preview"):
-                                for idx, slide in enumerate(slides_content):
-                                    st.markdown(f"### Slide {idx + 1}: {slide['title']}")
-                                    if slide.get('bullets'):
-                                        for bullet in slide['bullets']:
-                                            st.markdown(f"• {bullet}")
-                                    st.markdown("---")
+            render_generate_panel("admin", sidebar_settings)
         
         # TEMPLATES TAB
         with tab2:
             st.markdown("### 📁 Template Manager")
-            if st.session_state.templates:
-                for temp_id, template in st.session_state.templates.items():
-                    st.markdown(f"**{template['name']}** - {template['category']} | {template['slide_count']} slides")
-                    if st.button("Use", key=f"admin_use_{temp_id}"):
-                        st.session_state.selected_template = template
+            saved_templates = get_user_templates(user_id)
+            if saved_templates:
+                for temp_id, name, category, slide_count in saved_templates:
+                    # One element per row: the card text is the button label
+                    if st.button(f"Use **{name}** - {category} | {slide_count} slides", key=f"admin_use_{temp_id}"):
+                        st.session_state.selected_template = load_template(temp_id)
             else:
                 st.info("No templates saved yet")
         
@@ -1497,12 +2318,14 @@ if st.session_state.user['role'] == 'admin':
         # HISTORY TAB
         with tab4:
             st.markdown("### 📜 History")
-            my_activities = get_user_activity_details(st.session_state.user['id'])
+            my_activities = get_user_activity_details(user_id)
             if my_activities:
+                history = []
                 for activity in my_activities[:10]:
                     action, topic, slides_count, timestamp = activity
                     if action == 'generate_presentation':
-                        st.markdown(f"📊 {topic} | {slides_count} slides | {timestamp}")
+                        history.append(f"📊 {topic} | {slides_count} slides | {timestamp}")
+                st.markdown("\n\n".join(history))
         
         # SETTINGS TAB
         with tab5:
@@ -1524,120 +2347,16 @@ if st.session_state.user['role'] == 'admin':
         ])
         
         with user_tab1:
-            st.markdown("### 🟢 Live User Activity")
-            
-            if st.button("🔄 Refresh", key="admin_refresh"):
-                st.rerun()
-            
-            active_users = get_currently_logged_in_users()
-            
-            if active_users:
-                st.success(f"**{len(active_users)} user(s) online**")
-                
-                for user in active_users:
-                    user_id, username, email, login_time, role = user
-                    user_activity_stats = get_user_stats(user_id)
-                    
-                    st.markdown(f"""
-<div style='background:#e8f5e9;padding:15px;border-radius:8px;margin:10px 0;'>
-    <span class='online-indicator'></span>
-    <b>{username}</b> ({role})<br>
-    <small>📧 {email if email else 'N/A'} | 🕒 {login_time}</small><br>
-    <small>📊 {user_activity_stats['total_presentations']} ppts | 📄 {user_activity_stats['total_slides']} slides</small>
-</div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.warning("No users online")
+            show_live_dashboard()
         
         with user_tab2:
-            st.markdown("### ➕ Create User")
-            
-            with st.form("admin_create_user"):
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    new_username = st.text_input("Username *")
-                    new_email = st.text_input("Email")
-                with col_b:
-                    new_password = st.text_input("Password *", type="password")
-                    confirm_password = st.text_input("Confirm *", type="password")
-                
-                submitted = st.form_submit_button("✅ Create User", type="primary")
-                
-                if submitted:
-                    if new_username and new_password == confirm_password and len(new_password) >= 6:
-                        if create_user_by_admin(new_username, new_password, new_email):
-                            st.success(f"""
-✅ User Created!
-
-Username: `{new_username}`
-Password: `{new_password}`
-                            """)
-                        else:
-                            st.error("Username exists!")
+            show_create_user()
         
         with user_tab3:
-            st.markdown("### 👥 All Users")
-            
-            users = get_all_users()
-            user_data = []
-            for user in users:
-                user_data.append({
-                    'ID': user[0],
-                    'Username': user[1],
-                    'Email': user[2] if user[2] else 'N/A',
-                    'Created': user[3],
-                    'Active': '✅' if user[5] else '❌',
-                    'Role': user[6]
-                })
-            
-            df_users = pd.DataFrame(user_data)
-            st.dataframe(df_users, use_container_width=True)
-            
-            st.markdown("---")
-            col_m1, col_m2, col_m3 = st.columns(3)
-            with col_m1:
-                user_id_action = st.number_input("User ID", min_value=1, step=1)
-            with col_m2:
-                action_type = st.selectbox("Action", ["Enable", "Disable", "Delete"])
-            with col_m3:
-                st.write("")
-                if st.button("▶️ Execute", type="primary"):
-                    if user_id_action != 1:
-                        if action_type == "Enable":
-                            toggle_user_status(user_id_action, 1)
-                            st.success("Enabled!")
-                            time.sleep(1)
-                            st.rerun()
-                        elif action_type == "Disable":
-                            toggle_user_status(user_id_action, 0)
-                            st.warning("Disabled!")
-                            time.sleep(1)
-                            st.rerun()
-                        elif action_type == "Delete":
-                            delete_user(user_id_action)
-                            st.error("Deleted!")
-                            time.sleep(1)
-                            st.rerun()
+            show_manage_users()
         
         with user_tab4:
-            st.markdown("### 📊 Activity Log")
-            
-            all_activities = get_all_user_activities()
-            
-            if all_activities:
-                activity_records = []
-                for activity in all_activities:
-                    username, action, topic, slides_count, timestamp = activity
-                    activity_records.append({
-                        'Username': username,
-                        'Action': action,
-                        'Topic': topic if topic else '-',
-                        'Slides': slides_count if slides_count else '-',
-                        'Timestamp': timestamp
-                    })
-                
-                df_activities = pd.DataFrame(activity_records)
-                st.dataframe(df_activities, use_container_width=True, height=600)
+            show_activity_log()
 
 # ============================================================================
 # USER DASHBOARD (Full PPT Generator)
@@ -1658,167 +2377,17 @@ else:
     
     # CREATE TAB
     with tab1:
-        st.markdown("### 🚀 Quick Start with Templates")
-        
-        preset_templates = get_preset_templates()
-        cols = st.columns(3)
-        
-        for idx, (key, template) in enumerate(preset_templates.items()):
-            with cols[idx % 3]:
-                if st.button(
-                    f"{template['name']}\n{template['description']}", 
-                    key=f"user_preset_{key}",
-                    use_container_width=True
-                ):
-                    st.session_state.selected_template = template
-        
-        st.markdown("---")
-        
-        col1, col2 = st.columns([1, 1])
-        
-        with col1:
-            st.markdown('<div class="form-section">', unsafe_allow_html=True)
-            st.markdown("📝 Content Details", unsafe_allow_html=True)
-            
-            topic = st.text_input("Topic *", placeholder="e.g., AI in Healthcare", key="user_topic")
-            
-            if st.session_state.selected_template:
-                t = st.session_state.selected_template
-                default_category = t.get('category', 'Business')
-                default_slides = t.get('slide_count', 6)
-                default_tone = t.get('tone', 'Formal')
-                default_audience = t.get('audience', 'Corporate')
-                default_theme = t.get('theme', 'Corporate Blue')
-                default_image_mode = t.get('image_mode', 'With Images')
-                default_language = t.get('language', 'English')
-            else:
-                default_category = 'Business'
-                default_slides = 6
-                default_tone = 'Formal'
-                default_audience = 'Corporate'
-                default_theme = 'Corporate Blue'
-                default_image_mode = 'With Images'
-                default_language = 'English'
-            
-            categories = ["Business", "Pitch", "Marketing", "Technical", "Academic", "Training", "Sales"]
-            category = st.selectbox("Category *", categories, key="user_category")
-            
-            col1_1, col1_2 = st.columns(2)
-            with col1_1:
-                slide_count = st.number_input("Slides *", min_value=3, max_value=20, value=default_slides, key="user_slides")
-            with col1_2:
-                languages = ["English", "Hindi (हिंदी)", "Spanish", "French", "German"]
-                language = st.selectbox("Language", languages, key="user_lang")
-            
-            tones = ["Formal", "Neutral", "Inspirational", "Educational", "Persuasive"]
-            tone = st.selectbox("Tone *", tones, key="user_tone")
-            
-            st.markdown('</div>', unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown('<div class="form-section">', unsafe_allow_html=True)
-            st.markdown("🎨 Design & Style", unsafe_allow_html=True)
-            
-            audiences = ["Investors", "Students", "Corporate", "Clients", "Managers"]
-            audience = st.selectbox("Target Audience *", audiences, key="user_audience")
-            
-            themes_list = ["Corporate Blue", "Gradient Modern", "Minimal Dark", "Pastel Soft", "Professional Green", "Elegant Purple"]
-            theme = st.selectbox("Visual Theme *", themes_list, key="user_theme")
-            
-            image_modes = ["With Images", "No Images"]
-            image_mode = st.selectbox("Image Mode *", image_modes, key="user_imgmode")
-            
-            if image_mode == "With Images":
-                image_position = st.selectbox("Image Position", ["Right Side", "Left Side", "Top Right Corner", "Bottom", "Center"], key="user_imgpos")
-            else:
-                image_position = "Right Side"
-            
-            st.markdown('</div>', unsafe_allow_html=True)
-        
-        with st.expander("➕ Additional Options"):
-            key_points = st.text_area("Key Points", placeholder="- Point 1\n- Point 2", key="user_keypoints")
-            export_format = st.selectbox("Export Format", ["PowerPoint (.pptx)", "PowerPoint + PDF", "Google Slides (JSON)"], key="user_export")
-        
-        st.markdown("---")
-        
-        if st.button("🚀 Generate Presentation", use_container_width=True, type="primary", key="user_generate"):
-            if topic:
-                has_valid_api = False
-                if "Groq" in model_choice and groq_api_key:
-                    has_valid_api = True
-                elif "Grok" in model_choice and grok_api_key:
-                    has_valid_api = True
-                elif claude_api_key:
-                    has_valid_api = True
-                
-                if has_valid_api:
-                    with st.spinner("🤖 Generating your presentation..."):
-                        slides_content = generate_content_with_retry(
-                            claude_api_key, topic, category, slide_count, 
-                            tone, audience, key_points, model_choice, language,
-                            grok_api_key=grok_api_key,
-                            groq_api_key=groq_api_key
-                        )
-                        
-                        if slides_content:
-                            log_usage(st.session_state.user['id'], 'generate_presentation', topic, len(slides_content))
-                            
-                            prs = create_powerpoint(
-                                slides_content, theme, image_mode,
-                                google_api_key if 'google_api_key' in locals() else "",
-                                google_cx if 'google_cx' in locals() else "",
-                                use_unsplash_fallback, use_pexels_fallback, 
-                                pexels_api_key if use_pexels_fallback and 'pexels_api_key' in locals() else None,
-                                category, audience, topic, 
-                                image_position, logo_data
-                            )
-                            
-                            pptx_io = io.BytesIO()
-                            prs.save(pptx_io)
-                            pptx_io.seek(0)
-                            
-                            st.markdown("""
-                            <div class="download-section">
-                                <h2>🎉 Your Presentation is Ready!</h2>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.download_button(
-                                "📥 DOWNLOAD POWERPOINT",
-                                pptx_io.getvalue(),
-                                f"{topic.replace(' ', '_')}.pptx",
-                                "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                                use_container_width=True,
-                                type="primary"
-                            )
-                            
-                            st.balloons()
-                            
-                            with st.expander("📄 Preview Slides", expanded=True):
-                                for idx, slide in enumerate(slides_content):
-                                    st.markdown(f"### Slide {idx + 1}: {slide['title']}")
-                                    if slide.get('bullets'):
-                                        for bullet in slide['bullets']:
-                                            st.markdown(f"• {bullet}")
-                                    st.markdown("---")
-                            
-                            with st.expander("🎓 AI Coach"):
-                                issues, suggestions, score = analyze_presentation(slides_content)
-                                st.metric("Quality Score", f"{score}/100")
-                                if suggestions:
-                                    for suggestion in suggestions:
-                                        st.write(f"• {suggestion}")
-                else:
-                    st.error("⚠️ Please configure API keys in sidebar")
+        render_generate_panel("user", sidebar_settings)
     
     # TEMPLATES TAB
     with tab2:
         st.markdown("### 📁 Template Manager")
-        if st.session_state.templates:
-            for temp_id, template in st.session_state.templates.items():
-                st.markdown(f"**{template['name']}** - {template['category']} | {template['slide_count']} slides")
-                if st.button("Use", key=f"user_use_{temp_id}"):
-                    st.session_state.selected_template = template
+        saved_templates = get_user_templates(user_id)
+        if saved_templates:
+            for temp_id, name, category, slide_count in saved_templates:
+                # One element per row: the card text is the button label
+                if st.button(f"Use **{name}** - {category} | {slide_count} slides", key=f"user_use_{temp_id}"):
+                    st.session_state.selected_template = load_template(temp_id)
         else:
             st.info("No templates saved yet")
     
@@ -1830,17 +2399,14 @@ else:
     # HISTORY TAB
     with tab4:
         st.markdown("### 📜 Your History")
-        my_activities = get_user_activity_details(st.session_state.user['id'])
+        my_activities = get_user_activity_details(user_id)
         if my_activities:
+            cards = []
             for activity in my_activities[:10]:
                 action, topic, slides_count, timestamp = activity
                 if action == 'generate_presentation':
-                    st.markdown(f"""
-<div class='activity-card'>
-    <b>📊 {topic}</b><br>
-    <small>📄 {slides_count} slides | 🕒 {timestamp}</small>
-</div>
-                    """, unsafe_allow_html=True)
+                    cards.append(HISTORY_CARD_TMPL.format(topic=topic, slides_count=slides_count, timestamp=timestamp))
+            st.markdown("\n".join(cards), unsafe_allow_html=True)
         else:
             st.info("No history yet")
     
@@ -1853,7 +2419,7 @@ else:
 st.markdown("---")
 st.markdown(f"""
 <div style='text-align: center; color: #666;'>
-    <p>🔐 Logged in as: <b>{st.session_state.user['username']}</b> ({st.session_state.user['role']}) | {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
+    <p>🔐 Logged in as: <b>{username}</b> ({role}) | {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
     <p>✨ AI PowerPoint Generator Pro | Version 3.0</p>
 </div>
 """, unsafe_allow_html=True)